@@ -0,0 +1,25 @@
+"""Нагрузочные замеры yatube на больших объёмах данных.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.generate --scale small
+    python -m benchmarks.run --repeat 30
+    python -m benchmarks.compare benchmarks/results/old.json \
+        benchmarks/results/new.json
+
+Данные и кэш живут в отдельных файлах (см. benchmarks.settings) и не
+смешиваются с db.sqlite3 разработчика.
+"""
+import os
+import sys
+
+import django
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup():
+    """Настраивает Django с benchmarks.settings."""
+    sys.path.insert(0, os.path.join(ROOT, 'yatube'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
@@ -0,0 +1,63 @@
+"""Сравнение двух файлов результатов benchmarks.run.
+
+    python -m benchmarks.compare base.json new.json --threshold 10
+
+Код возврата 1, если p50 или p99 какого-то адреса выросли больше чем на
+threshold процентов или выросло число запросов.
+"""
+import argparse
+import json
+
+
+def change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(base, new, threshold):
+    """Строки отчёта и признак регрессии."""
+    lines = [
+        f'{"адрес":<18}{"p50, мс":>18}{"p99, мс":>18}{"запросов":>10}'
+    ]
+    regressed = False
+    for name, result in new['results'].items():
+        old = base['results'].get(name)
+        if old is None:
+            lines.append(f'{name:<18} новый адрес')
+            continue
+        p50 = change(old['p50_ms'], result['p50_ms'])
+        p99 = change(old['p99_ms'], result['p99_ms'])
+        worse = (
+            p50 > threshold or p99 > threshold
+            or result['queries'] > old['queries']
+        )
+        regressed = regressed or worse
+        lines.append(
+            f'{name:<18}{result["p50_ms"]:>10.1f} ({p50:+5.0f}%)'
+            f'{result["p99_ms"]:>10.1f} ({p99:+5.0f}%)'
+            f'{old["queries"]:>4} → {result["queries"]:<3}'
+            + ('  РЕГРЕССИЯ' if worse else '')
+        )
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument(
+        '--threshold', type=float, default=10,
+        help='Допустимый рост p50/p99 в процентах.'
+    )
+    args = parser.parse_args()
+    with open(args.base) as file:
+        base = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    print(f'{base["commit"]} → {new["commit"]}')
+    lines, regressed = compare(base, new, args.threshold)
+    print('\n'.join(lines))
+    raise SystemExit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""Генератор данных для замеров: пользователи, группы, подписки с
+распределением по степенному закону, посты, комментарии и картинки.
+
+    python -m benchmarks.generate --scale large
+    python -m benchmarks.generate --scale small --posts 50000
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+from datetime import timedelta
+
+from benchmarks import setup
+
+SCALES = {
+    'small': {
+        'users': 1000, 'groups': 20, 'posts': 20000, 'comments': 20000,
+        'images': 100,
+    },
+    'medium': {
+        'users': 10000, 'groups': 100, 'posts': 1000000,
+        'comments': 1000000, 'images': 1000,
+    },
+    'large': {
+        'users': 100000, 'groups': 500, 'posts': 10000000,
+        'comments': 5000000, 'images': 10000,
+    },
+}
+BATCH_SIZE = 10000
+# Показатель степенного закона популярности авторов: чем больше, тем
+# сильнее подписки и посты сосредоточены у немногих «звёзд».
+POPULARITY_EXPONENT = 1.1
+# Среднее и максимум подписок одного пользователя.
+MEAN_FOLLOWING = 30
+MAX_FOLLOWING = 2000
+TEXT_POOL_SIZE = 1000
+
+
+def log(message):
+    print(f'[{time.strftime("%H:%M:%S")}] {message}', flush=True)
+
+
+class Generator:
+
+    def __init__(self, sizes, seed):
+        from faker import Faker
+
+        self.sizes = sizes
+        self.random = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.texts = [
+            self.faker.paragraph(nb_sentences=self.random.randint(1, 6))
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+        self.now = None
+
+    def popularity(self, user_ids):
+        """Накопленные веса авторов: вес i-го по популярности — 1/i^s."""
+        ranked = list(user_ids)
+        self.random.shuffle(ranked)
+        weights = itertools.accumulate(
+            1 / (rank + 1) ** POPULARITY_EXPONENT
+            for rank in range(len(ranked))
+        )
+        return ranked, list(weights)
+
+    def date(self):
+        return self.now - timedelta(seconds=self.random.randrange(365 * 86400))
+
+    def users(self):
+        from core.bulk import batches
+        from django.contrib.auth.hashers import make_password
+        from posts.models import User
+
+        password = make_password('benchmark')
+        first_names = [self.faker.first_name() for _ in range(200)]
+        last_names = [self.faker.last_name() for _ in range(200)]
+        for batch in batches(range(self.sizes['users']), BATCH_SIZE):
+            User.objects.bulk_create(
+                User(
+                    username=f'user{index}', password=password,
+                    first_name=self.random.choice(first_names),
+                    last_name=self.random.choice(last_names),
+                ) for index in batch
+            )
+        return list(User.objects.values_list('pk', flat=True))
+
+    def groups(self):
+        from mixer.backend.django import mixer
+        from posts.models import Group
+
+        mixer.cycle(self.sizes['groups']).blend(
+            Group, slug=mixer.sequence('group-{0}'),
+            title=mixer.faker.company, description=mixer.faker.text,
+        )
+        return list(Group.objects.values_list('pk', flat=True))
+
+    def follows(self, user_ids, ranked, weights):
+        """Число подписок пользователя — по Парето, авторы — по
+        популярности."""
+        from core.bulk import batches
+        from posts.models import Follow
+
+        def pairs():
+            for user_id in user_ids:
+                wanted = min(
+                    MAX_FOLLOWING, len(ranked) - 1,
+                    int(self.random.paretovariate(1.5) * MEAN_FOLLOWING / 3)
+                )
+                authors = set(self.random.choices(
+                    ranked, cum_weights=weights, k=wanted
+                ))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        for batch in batches(pairs(), BATCH_SIZE):
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def image(self, index):
+        from django.conf import settings
+        from PIL import Image
+
+        name = f'posts/benchmark_{index}.jpg'
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        color = tuple(self.random.randrange(256) for _ in range(3))
+        Image.new('RGB', (1280, 720), color).save(path, quality=80)
+        return name
+
+    def posts(self, ranked, weights, group_ids):
+        from core.bulk import batches, explicit_dates
+        from posts.models import Post
+
+        images = self.sizes['images']
+        total = self.sizes['posts']
+        image_every = max(1, total // images) if images else 0
+
+        def rows():
+            for index in range(total):
+                image = ''
+                if image_every and index % image_every == 0 and (
+                    index // image_every < images
+                ):
+                    image = self.image(index // image_every)
+                yield Post(
+                    text=self.random.choice(self.texts),
+                    pub_date=self.date(),
+                    author_id=self.random.choices(
+                        ranked, cum_weights=weights
+                    )[0],
+                    group_id=(
+                        self.random.choice(group_ids)
+                        if group_ids and self.random.random() < 0.5
+                        else None
+                    ),
+                    image=image,
+                )
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            for number, batch in enumerate(batches(rows(), BATCH_SIZE), 1):
+                Post.objects.bulk_create(batch)
+                if number % 100 == 0:
+                    log(f'  постов: {number * BATCH_SIZE}')
+
+    def comments(self, user_ids):
+        from core.bulk import batches, explicit_dates
+        from django.db.models import Max, Min
+        from posts.models import Comment, Post
+
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return
+
+        def rows():
+            for _ in range(self.sizes['comments']):
+                yield Comment(
+                    post_id=self.random.randint(bounds['low'], bounds['high']),
+                    author_id=self.random.choice(user_ids),
+                    text=self.random.choice(self.texts)[:200],
+                    created=self.date(),
+                )
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            for batch in batches(rows(), BATCH_SIZE):
+                Comment.objects.bulk_create(batch)
+
+    def run(self):
+        from django.conf import settings
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from django.db import connection, transaction
+        from django.utils import timezone
+        from posts import counters, feed
+
+        self.now = timezone.now()
+        call_command('migrate', verbosity=0)
+        steps = (
+            ('пользователи', self.users),
+            ('группы', self.groups),
+        )
+        results = {}
+        for title, step in steps:
+            log(title)
+            with transaction.atomic():
+                results[title] = step()
+        user_ids = results['пользователи']
+        ranked, weights = self.popularity(user_ids)
+        log('подписки')
+        with transaction.atomic():
+            self.follows(user_ids, ranked, weights)
+        log('посты')
+        with transaction.atomic():
+            self.posts(ranked, weights, results['группы'])
+        log('комментарии')
+        with transaction.atomic():
+            self.comments(user_ids)
+        log('счётчики')
+        counters.rebuild()
+        if settings.FEED_FANOUT:
+            log('ленты')
+            feed.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cache.clear()
+        log('готово')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for name in SCALES['small']:
+        parser.add_argument(f'--{name}', type=int, help=f'Сколько: {name}.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    sizes = {
+        name: getattr(args, name) if getattr(args, name) is not None
+        else default
+        for name, default in SCALES[args.scale].items()
+    }
+    setup()
+    from django.conf import settings
+
+    if os.path.exists(settings.DATABASES['default']['NAME']):
+        raise SystemExit(
+            'База для замеров уже есть; удалите benchmarks/data, чтобы '
+            'создать данные заново.'
+        )
+    os.makedirs(settings.DATA_DIR, exist_ok=True)
+    log(f'Создаём данные: {sizes}')
+    Generator(sizes, args.seed).run()
+
+
+if __name__ == '__main__':
+    main()
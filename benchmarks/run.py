@@ -0,0 +1,196 @@
+"""Замер времени ответа и числа запросов для всех адресов posts.urls.
+
+    python -m benchmarks.run --repeat 30
+    python -m benchmarks.run --cold --output benchmarks/results/cold.json
+
+Запросы идут через тестовый клиент Django в этом же процессе: в замер
+входит весь стек middleware, шаблоны и кэш, но не сеть и не WSGI-сервер.
+Результат — JSON с p50/p99 в миллисекундах и числом запросов к базе для
+каждого адреса; его сравнивает benchmarks.compare.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import time
+
+from benchmarks import ROOT, setup
+
+FOLLOW_NAMES = ('profile_follow', 'profile_unfollow')
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(share * len(ordered)))
+    return ordered[rank - 1]
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Targets:
+    """Аргументы и клиент для каждого адреса posts.urls на текущих
+    данных: самая большая группа, самый популярный автор, пост с
+    комментариями и картинкой, читатель с большой лентой."""
+
+    def __init__(self):
+        from django.db.models import Count
+        from django.test import Client
+        from posts.models import Follow, Group, Post, User
+
+        self.reader = User.objects.order_by(
+            '-counters__following_count'
+        ).first()
+        if self.reader is None:
+            raise SystemExit(
+                'Нет данных: сначала запустите python -m benchmarks.generate'
+            )
+        star = User.objects.order_by('-counters__followers_count').first()
+        self.group = (
+            Group.objects.annotate(size=Count('posts'))
+            .order_by('-size').first()
+        )
+        self.post = (
+            Post.objects.exclude(image='').filter(author=self.reader).first()
+            or Post.objects.filter(author=self.reader).first()
+            or Post.objects.order_by('-pk').first()
+        )
+        followed = Follow.objects.filter(user=self.reader).values('author')
+        self.stranger = (
+            User.objects.exclude(pk__in=followed).exclude(pk=self.reader.pk)
+            .order_by('-counters__followers_count').first()
+        )
+        self.author = star
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def kwargs(self, pattern):
+        """Значения параметров адреса по именам из шаблона пути."""
+        username = (
+            self.stranger if pattern.name in FOLLOW_NAMES else self.author
+        ).username
+        values = {
+            'slug': self.group.slug,
+            'username': username,
+            'post_id': self.post.pk,
+        }
+        return {
+            name: values[name] for name in pattern.pattern.converters
+        }
+
+    def prepare(self, name):
+        """Возвращает подписку в исходное состояние, чтобы каждый повтор
+        подписки и отписки выполнял одну и ту же работу."""
+        from posts.models import Follow
+
+        if name == 'profile_follow':
+            Follow.objects.filter(
+                user=self.reader, author=self.stranger
+            ).delete()
+        elif name == 'profile_unfollow':
+            Follow.objects.get_or_create(
+                user=self.reader, author=self.stranger
+            )
+
+    def request(self, name, url):
+        if name == 'add_comment':
+            return self.client.post(url, {'text': 'Замер'})
+        if name == 'search':
+            return self.client.get(url, {'q': self.post.text.split()[0]})
+        return self.client.get(url)
+
+
+def measure(targets, pattern, repeat, cold):
+    from core.queries import QueryLog
+    from django.core.cache import cache
+    from django.urls import reverse
+
+    name = pattern.name
+    url = reverse(f'posts:{name}', kwargs=targets.kwargs(pattern))
+    timings, queries = [], []
+    status = None
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        targets.prepare(name)
+        # Только счёт: обход стека на каждый запрос исказил бы время.
+        with QueryLog(locate=False) as log:
+            started = time.perf_counter()
+            response = targets.request(name, url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(log.count)
+        status = response.status_code
+    return {
+        'url': url,
+        'status': status,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': max(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--repeat', type=int, default=30,
+        help='Сколько раз запрашивать каждый адрес.'
+    )
+    parser.add_argument(
+        '--cold', action='store_true',
+        help='Очищать кэш перед каждым запросом.'
+    )
+    parser.add_argument(
+        '--output', help='Файл результатов (по умолчанию '
+        'benchmarks/results/<коммит>.json).'
+    )
+    args = parser.parse_args()
+    setup()
+    from posts import urls
+    from posts.models import Comment, Follow, Post, User
+
+    targets = Targets()
+    results = {}
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        results[name] = result = measure(
+            targets, pattern, args.repeat, args.cold
+        )
+        print(
+            f'{name:<18} {result["status"]:>3} p50 {result["p50_ms"]:>8.1f} '
+            f'мс  p99 {result["p99_ms"]:>8.1f} мс  запросов '
+            f'{result["queries"]:>3}', flush=True
+        )
+    report = {
+        'commit': commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat,
+        'cold': args.cold,
+        'data': {
+            'users': User.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f'{report["commit"]}.json'
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f'Результаты: {output}')
+
+
+if __name__ == '__main__':
+    main()
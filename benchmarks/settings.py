@@ -0,0 +1,28 @@
+import os
+
+from yatube.settings import *  # noqa: F401,F403
+from yatube.settings import CACHES, DATABASES
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+DATABASES = {
+    **DATABASES,
+    'default': {
+        **DATABASES['default'],
+        'NAME': os.path.join(DATA_DIR, 'bench.sqlite3'),
+    },
+}
+CACHES = {
+    **CACHES,
+    'default': {
+        **CACHES['default'],
+        'LOCATION': os.path.join(DATA_DIR, 'cache.sqlite3'),
+    },
+}
+MEDIA_ROOT = os.path.join(DATA_DIR, 'media')
+THUMBNAIL_KVSTORE_PATH = os.path.join(DATA_DIR, 'thumbnails.sqlite3')
+# Замер не должен падать на бюджете запросов: число запросов — результат.
+QUERY_BUDGET_RAISE = False
+THUMBNAIL_ASYNC = False
@@ -0,0 +1,26 @@
+"""Помощники массовой загрузки: общие для load_posts и генератора данных
+benchmarks.generate."""
+import itertools
+from contextlib import contextmanager
+
+
+def batches(iterable, size):
+    """Списки по size элементов из iterable; последний — короче."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Разрешает задавать даты полей с auto_now_add при bulk_create."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
@@ -0,0 +1,294 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    # Число записей и их общий размер ведут триггеры, поэтому проверка
+    # лимитов после записи не сканирует таблицу.
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' entries INTEGER NOT NULL, bytes INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_ai AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1,'
+    ' bytes = bytes + new.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_ad AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1,'
+    ' bytes = bytes - old.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_au AFTER UPDATE OF size ON cache'
+    ' BEGIN UPDATE cache_stats SET bytes = bytes - old.size + new.size;'
+    ' END',
+    # Сверка при подключении: чинит счётчики файлов, где их сбивал
+    # INSERT OR REPLACE (замена не запускает cache_ad).
+    'UPDATE cache_stats SET entries = (SELECT COUNT(*) FROM cache),'
+    ' bytes = (SELECT COALESCE(SUM(size), 0) FROM cache)',
+)
+
+# Время обращения к прочитанным записям копится в памяти процесса и
+# пишется в файл вместе с ближайшей записью в кэш, но не реже, чем раз
+# в столько секунд: чтение не берёт блокировку записи.
+ACCESS_FLUSH_INTERVAL = 10.0
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на одном сервере.
+
+    LOCATION — путь к файлу. Журнал WAL позволяет читать параллельно с
+    записью, поэтому фрагменты страниц и поколения кэша (posts.utils)
+    видны всем воркерам сразу, без Redis и memcached.
+
+    Вытеснение — по давности обращения (LRU): когда записей больше
+    MAX_ENTRIES или их размер больше MAX_SIZE байт, удаляются сначала
+    просроченные, а потом самые давно прочитанные записи — 1/CULL_FREQUENCY
+    от числа записей или объёма. Целые числа хранятся как INTEGER, поэтому
+    incr — один атомарный UPDATE.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        options = params.get('OPTIONS', {})
+        max_size = options.get('MAX_SIZE')
+        self.max_size = int(max_size) if max_size else None
+        self.local = threading.local()
+        self.accessed = {}
+        self.accessed_lock = threading.Lock()
+        self.flushed = time.monotonic()
+
+    @property
+    def connection(self):
+        """Соединение текущего потока; после fork открывается заново."""
+        if getattr(self.local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self.transaction(connection):
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    @contextmanager
+    def transaction(self, connection=None):
+        """Пишущая транзакция: BEGIN IMMEDIATE сразу берёт блокировку
+        записи, поэтому чтение-изменение-запись атомарно между
+        процессами."""
+        connection = connection or self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def encode(self, value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def size_of(self, key, value):
+        return len(key) + (8 if isinstance(value, int) else len(value))
+
+    def key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        rows = self.connection.execute(
+            'SELECT key, value, accessed FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(keys))
+            ), (*keys, now)
+        ).fetchall()
+        self.count_fragments(keys, rows)
+        with self.accessed_lock:
+            for key, _, _ in rows:
+                self.accessed[key] = now
+            due = time.monotonic() - self.flushed > ACCESS_FLUSH_INTERVAL
+        if due:
+            with self.transaction() as connection:
+                self.flush_accessed(connection)
+        return {keys[key]: self.decode(value) for key, value, _ in rows}
+
+    def flush_accessed(self, connection):
+        """Записывает накопленное время обращения к записям; вызывается
+        внутри пишущей транзакции."""
+        with self.accessed_lock:
+            accessed, self.accessed = self.accessed, {}
+            self.flushed = time.monotonic()
+        if accessed:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ? '
+                'AND accessed < ?',
+                [(when, key, when) for key, when in accessed.items()]
+            )
+
+    def count_fragments(self, keys, rows):
+        """Попадания и промахи кэша фрагментов {% cache %} в метрики."""
+        found = {key for key, _, _ in rows}
+        for key in keys:
+            name = metrics.fragment_name(key)
+            if name is not None:
+                metrics.fragment_cache.inc(
+                    fragment=name, result='hit' if key in found else 'miss'
+                )
+
+    def store(self, connection, key, value, timeout):
+        value = self.encode(value)
+        # Не INSERT OR REPLACE: замена удаляет старую строку без триггера
+        # cache_ad, и cache_stats растёт с каждой перезаписью.
+        connection.execute(
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed, size = excluded.size', (
+                key, value, self.get_backend_timeout(timeout), time.time(),
+                self.size_of(key, value)
+            )
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.transaction() as connection:
+            for key, value in data.items():
+                self.store(connection, self.key(key, version), value, timeout)
+            self.flush_accessed(connection)
+            self.cull(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.key(key, version)
+        with self.transaction() as connection:
+            if self.exists(connection, key):
+                return False
+            self.store(connection, key, value, timeout)
+            self.flush_accessed(connection)
+            self.cull(connection)
+        return True
+
+    def exists(self, connection, key):
+        return connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def has_key(self, key, version=None):
+        return self.exists(self.connection, self.key(key, version))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.key(key, version)
+        with self.transaction() as connection:
+            return connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time())
+            ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.key(key, version)
+        with self.transaction() as connection:
+            updated = connection.execute(
+                "UPDATE cache SET value = value + ? WHERE key = ? "
+                "AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, made_key, time.time())
+            ).rowcount
+            if updated:
+                return connection.execute(
+                    'SELECT value FROM cache WHERE key = ?', (made_key,)
+                ).fetchone()[0]
+            if not self.exists(connection, made_key):
+                raise ValueError(f"Key '{key}' not found")
+        # Не целое число: тот же результат, что у других бэкендов.
+        value = self.get(key, version=version) + delta
+        self.set(key, value, version=version)
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        with self.transaction() as connection:
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self.key(key, version),) for key in keys]
+            )
+
+    def clear(self):
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def stats(self):
+        """Число записей и их общий размер в байтах."""
+        entries, size = self.connection.execute(
+            'SELECT entries, bytes FROM cache_stats'
+        ).fetchone()
+        return {'entries': entries, 'bytes': size}
+
+    def over_limits(self, connection):
+        """Сколько записей и байт сверх MAX_ENTRIES и MAX_SIZE."""
+        entries, size = connection.execute(
+            'SELECT entries, bytes FROM cache_stats'
+        ).fetchone()
+        extra_size = 0 if self.max_size is None else size - self.max_size
+        return entries - self._max_entries, extra_size
+
+    def cull(self, connection):
+        """Удаляет просроченные и давно не читанные записи сверх лимитов."""
+        if max(self.over_limits(connection)) <= 0:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        extra_entries, extra_size = self.over_limits(connection)
+        if max(extra_entries, extra_size) <= 0:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        if extra_entries > 0:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                (max(1, self._max_entries // self._cull_frequency),)
+            )
+        if extra_size > 0:
+            keep = self.max_size - self.max_size // self._cull_frequency
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM ('
+                ' SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key)'
+                ' AS kept FROM cache) WHERE kept > ?)', (keep,)
+            )
@@ -0,0 +1,111 @@
+import gzip
+import re
+import secrets
+import zlib
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Типы, которые стоит сжимать; картинки, архивы и видео уже сжаты.
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript',
+    'application/x-ndjson', 'application/xml', 'image/svg+xml',
+)
+# Содержимое этих тегов выводится как есть, его не трогаем.
+RAW_TAGS = re.compile(
+    r'<(pre|textarea|script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL
+)
+# Пробелы, среди которых есть перевод строки: отступы и пустые строки.
+NEWLINE_RUN = re.compile(r'\s*\n\s*')
+QUALITY = re.compile(r'q\s*=\s*([0-9.]+)')
+
+
+def minify(html):
+    """Схлопывает отступы и пустые строки шаблонов в один перевод строки.
+
+    Вне pre, textarea, script и style браузер показывает любую
+    последовательность пробелов как один пробел, так что страница
+    выглядит так же; пробелы целиком не удаляются нигде.
+    """
+    parts = []
+    position = 0
+    for match in RAW_TAGS.finditer(html):
+        parts.append(NEWLINE_RUN.sub('\n', html[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(NEWLINE_RUN.sub('\n', html[position:]))
+    return ''.join(parts)
+
+
+def choose_encoding(accept_encoding):
+    """br или gzip по заголовку Accept-Encoding с учётом q; None, если
+    клиент не принимает ни того, ни другого."""
+    offered = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        match = QUALITY.search(params)
+        try:
+            offered[name.strip().lower()] = float(match[1]) if match else 1
+        except ValueError:
+            continue
+    candidates = ['br', 'gzip'] if brotli else ['gzip']
+    quality = {
+        name: offered.get(name, offered.get('*', 0)) for name in candidates
+    }
+    best = max(candidates, key=quality.get)
+    return best if quality[best] > 0 else None
+
+
+def compressible(response):
+    if response.has_header('Content-Encoding'):
+        return False
+    if 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+        return False
+    return response.streaming or (
+        len(response.content) >= settings.COMPRESS_MIN_LENGTH
+    )
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(
+            data, quality=settings.COMPRESS_BROTLI_QUALITY
+        )
+    return gzip.compress(data, settings.COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Сжимает потоковый ответ, отдавая сжатое после каждого куска."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(
+            quality=settings.COMPRESS_BROTLI_QUALITY
+        )
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(
+        settings.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def padding():
+    """HTML-комментарий случайной длины: размер сжатой страницы
+    с CSRF-токеном перестаёт точно отражать её содержимое (BREACH)."""
+    length = secrets.randbelow(settings.COMPRESS_BREACH_PADDING + 1)
+    return f'<!-- {secrets.token_urlsafe(length)[:length]} -->'
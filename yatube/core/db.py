@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(connection, pragmas=None):
+    """Выполняет PRAGMA из pragmas (по умолчанию SQLITE_PRAGMAS)."""
+    if pragmas is None:
+        pragmas = settings.SQLITE_PRAGMAS
+    cursor = connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение с SQLite."""
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection)
@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+OPERATIONS = ('set', 'get', 'incr')
+# Размер значения примерно как у закэшированного фрагмента ленты.
+VALUE = 'x' * 8 * 1024
+
+
+def make_cache(backend, directory):
+    location = {
+        'locmem': 'bench',
+        'filebased': os.path.join(directory, 'filebased'),
+        'sqlite': os.path.join(directory, 'cache.sqlite3'),
+    }[backend]
+    return import_string(BACKENDS[backend])(
+        location, {'OPTIONS': {'MAX_ENTRIES': 100000}}
+    )
+
+
+def run(args):
+    """Выполняет operations операций name в отдельном процессе."""
+    backend, directory, name, operations, worker = args
+    cache = make_cache(backend, directory)
+    keys = [f'bench:{worker}:{index % 1000}' for index in range(operations)]
+    if name != 'set':
+        cache.set_many({key: 0 if name == 'incr' else VALUE
+                        for key in set(keys)}, None)
+    started = time.perf_counter()
+    if name == 'set':
+        for key in keys:
+            cache.set(key, VALUE)
+    elif name == 'get':
+        for key in keys:
+            cache.get(key)
+    else:
+        for key in keys:
+            cache.incr(key)
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость кэшей LocMem, FileBasedCache и SQLiteCache '
+        'при одновременной работе нескольких процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations', type=int, default=1000,
+            help='Число операций каждого вида в каждом процессе.'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=4,
+            help='Сколько процессов обращаются к кэшу одновременно.'
+        )
+        parser.add_argument(
+            '--backend', choices=BACKENDS, action='append',
+            help='Какие кэши сравнивать (по умолчанию все).'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        operations = options['operations']
+        self.stdout.write(
+            f'{processes} процесс(ов) x {operations} операций, '
+            'тысяч операций в секунду:'
+        )
+        self.stdout.write(
+            f'{"кэш":<10}' + ''.join(f'{name:>10}' for name in OPERATIONS)
+        )
+        context = multiprocessing.get_context('fork')
+        for backend in options['backend'] or BACKENDS:
+            directory = tempfile.mkdtemp()
+            try:
+                with context.Pool(processes) as pool:
+                    rates = []
+                    for name in OPERATIONS:
+                        elapsed = pool.map(run, [
+                            (backend, directory, name, operations, worker)
+                            for worker in range(processes)
+                        ])
+                        rates.append(
+                            processes * operations / max(elapsed) / 1000
+                        )
+            finally:
+                shutil.rmtree(directory)
+            self.stdout.write(
+                f'{backend:<10}' + ''.join(f'{rate:>10.1f}' for rate in rates)
+            )
+        self.stdout.write(self.style.WARNING(
+            'LocMem быстрее всех, но у каждого процесса свой кэш: '
+            'фрагмент, собранный одним воркером, другим не виден.'
+        ))
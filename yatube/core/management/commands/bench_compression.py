@@ -0,0 +1,80 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import compression
+from posts.models import Post
+
+
+def pages():
+    """Адреса типичных страниц по первому посту с группой."""
+    post = Post.objects.filter(group__isnull=False).select_related(
+        'author', 'group').first()
+    if post is None:
+        raise CommandError('Нет постов с группой: заполните базу.')
+    return {
+        'index': reverse('posts:index'),
+        'group': reverse('posts:group_list', args=[post.group.slug]),
+        'profile': reverse('posts:profile', args=[post.author.username]),
+        'post_detail': reverse('posts:post_detail', args=[post.pk]),
+        'search': reverse('posts:search') + '?q=' + post.text.split()[0],
+    }
+
+
+def timed(function, argument, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function(argument)
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Размер страниц до и после минификации и сжатия gzip и brotli '
+        'и время каждого шага.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторять каждый шаг для замера времени.'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        client = Client(HTTP_HOST='localhost')
+        steps = [
+            ('gzip', lambda data: compression.compress(data, 'gzip')),
+        ]
+        if compression.brotli:
+            steps.append(
+                ('br', lambda data: compression.compress(data, 'br'))
+            )
+        else:
+            self.stdout.write(self.style.WARNING(
+                'brotli не установлен, сравнивается только gzip.'
+            ))
+        self.stdout.write(
+            f'{"страница":<12}{"байт":>8}{"minify":>8}'
+            + ''.join(f'{name:>8}' for name, _ in steps)
+            + f'{"мс minify":>11}'
+            + ''.join(f'{"мс " + name:>9}' for name, _ in steps)
+        )
+        for name, url in pages().items():
+            with override_settings(HTML_MINIFY=False):
+                html = client.get(url).content.decode()
+            minified, minify_ms = timed(compression.minify, html, repeat)
+            data = minified.encode()
+            sizes, times = [], []
+            for _, step in steps:
+                compressed, elapsed = timed(step, data, repeat)
+                sizes.append(len(compressed))
+                times.append(elapsed)
+            self.stdout.write(
+                f'{name:<12}{len(html.encode()):>8}{len(data):>8}'
+                + ''.join(f'{size:>8}' for size in sizes)
+                + f'{minify_ms:>11.2f}'
+                + ''.join(f'{elapsed:>9.2f}' for elapsed in times)
+            )
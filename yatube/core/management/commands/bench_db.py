@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT NOT NULL,'
+    ' pub_date REAL NOT NULL, author_id INTEGER NOT NULL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+)
+# Запросы, похожие на главную страницу и на post_create.
+READ_SQL = (
+    'SELECT id, text, author_id FROM post ORDER BY pub_date DESC '
+    'LIMIT 10 OFFSET ?'
+)
+WRITE_SQL = 'INSERT INTO post (text, pub_date, author_id) VALUES (?, ?, ?)'
+
+
+def connect(path, tuned):
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if tuned:
+        apply_pragmas(connection, settings.SQLITE_PRAGMAS)
+    return connection
+
+
+def worker(args):
+    """Выполняет «запросы» чтения или записи в течение seconds секунд.
+
+    Без настроек каждый запрос открывает новое соединение, как при
+    CONN_MAX_AGE = 0; с настройками соединение одно на процесс.
+    """
+    path, tuned, writer, seconds, number = args
+    done = errors = 0
+    connection = connect(path, tuned) if tuned else None
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        current = connection or connect(path, tuned)
+        try:
+            if writer:
+                current.execute('BEGIN IMMEDIATE')
+                current.execute(WRITE_SQL, ('x' * 200, time.time(), number))
+                current.execute('COMMIT')
+            else:
+                current.execute(READ_SQL, (done % 100,)).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if current.in_transaction:
+                current.execute('ROLLBACK')
+        finally:
+            if connection is None:
+                current.close()
+    return writer, done, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при одновременном чтении '
+        'и записи без настроек и с SQLITE_PRAGMAS и постоянным соединением.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность каждого прогона.'
+        )
+        parser.add_argument(
+            '--rows', type=int, default=10000,
+            help='Сколько постов создать перед прогоном.'
+        )
+
+    def prepare(self, path, rows):
+        connection = sqlite3.connect(path)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(WRITE_SQL, (
+            ('x' * 200, index, index % 100) for index in range(rows)
+        ))
+        connection.commit()
+        connection.close()
+
+    def handle(self, *args, **options):
+        readers, writers = options['readers'], options['writers']
+        seconds = options['seconds']
+        self.stdout.write(
+            f'{readers} читателя(ей), {writers} писателя(ей), '
+            f'{seconds:g} с; запросов в секунду:'
+        )
+        self.stdout.write(
+            f'{"режим":<12}{"чтение":>10}{"запись":>10}{"ошибки":>10}'
+        )
+        context = multiprocessing.get_context('fork')
+        for tuned in (False, True):
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, 'bench.sqlite3')
+            try:
+                self.prepare(path, options['rows'])
+                tasks = [
+                    (path, tuned, number < writers, seconds, number)
+                    for number in range(readers + writers)
+                ]
+                with context.Pool(len(tasks)) as pool:
+                    results = pool.map(worker, tasks)
+            finally:
+                shutil.rmtree(directory)
+            reads = sum(done for writer, done, _ in results if not writer)
+            writes = sum(done for writer, done, _ in results if writer)
+            errors = sum(error for _, _, error in results)
+            self.stdout.write(
+                f'{"настроенный" if tuned else "исходный":<12}'
+                f'{reads / seconds:>10.0f}{writes / seconds:>10.0f}'
+                f'{errors:>10}'
+            )
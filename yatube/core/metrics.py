@@ -0,0 +1,282 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Границы корзин гистограмм по умолчанию, в секундах.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf
+)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f'{self.name}: ожидались метки {self.labelnames}'
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+    def merge(self, total, value):
+        return (total or 0) + value
+
+    def samples(self, key, value):
+        yield self.name + '_total', key, value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help_text, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            counts, total = self.values.get(
+                key, ([0] * len(self.buckets), 0.0)
+            )
+            # Новый список: снимок для файла не меняется под ногами.
+            counts = list(counts)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.values[key] = (counts, total + value)
+        self.registry.changed()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, total, value):
+        if total is None:
+            return list(value[0]), value[1]
+        counts = [a + b for a, b in zip(total[0], value[0])]
+        return counts, total[1] + value[1]
+
+    def samples(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            le = '+Inf' if bound == math.inf else repr(float(bound))
+            yield self.name + '_bucket', key + (('le', le),), cumulative
+        yield self.name + '_sum', key, total
+        yield self.name + '_count', key, cumulative
+
+
+class Registry:
+    """Метрики процесса; потокобезопасны.
+
+    Если задан directory, значения процесса раз в flush_interval секунд
+    сбрасываются в directory/<pid>.json, а выгрузка суммирует файлы всех
+    процессов: так /metrics у любого воркера отдаёт общие числа.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.flushed = 0.0
+
+    def reset(self):
+        """Обнуляет значения, например в процессе после fork."""
+        self.lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric.values = {}
+        self.flushed = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(self, name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self.register(
+            Histogram(self, name, help_text, labelnames, buckets)
+        )
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: [[list(key), value]
+                       for key, value in metric.values.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    def changed(self):
+        if self.directory and (
+            time.monotonic() - self.flushed > self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Атомарно записывает значения процесса в его файл."""
+        if not self.directory:
+            return
+        self.flushed = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def prune(self):
+        """Удаляет файлы завершившихся процессов.
+
+        Вызывается при старте: иначе файл мёртвого воркера суммировался бы
+        вечно, а новый процесс с тем же pid затёр бы его своими числами.
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            pid = filename.split('.', 1)[0]
+            if not pid.isdigit() or (
+                int(pid) != os.getpid() and alive(int(pid))
+            ):
+                continue
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        """{имя: {метки: значение}} по всем процессам."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            self.flush()
+            snapshots = []
+            for filename in sorted(os.listdir(self.directory)):
+                if not filename.endswith('.json'):
+                    continue
+                with open(os.path.join(self.directory, filename)) as file:
+                    snapshots.append(json.load(file))
+        merged = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in values:
+                    key = tuple(key)
+                    merged[name][key] = metric.merge(
+                        merged[name].get(key), value
+                    )
+        return merged
+
+    def render(self):
+        """Текстовый формат Prometheus."""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.help_text}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(values.items()):
+                labels = tuple(zip(metric.labelnames, key))
+                for sample, sample_labels, number in metric.samples(
+                    labels, value
+                ):
+                    lines.append(
+                        f'{sample}{format_labels(sample_labels)} {number}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но чужой.
+        return True
+    return True
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name, value.replace('\\', '\\\\').replace('"', '\\"')
+        ) for name, value in labels
+    ) + '}'
+
+
+def fragment_name(key):
+    """Имя фрагмента {% cache %} по ключу кэша или None."""
+    _, found, rest = key.partition('template.cache.')
+    return rest.split('.', 1)[0] if found else None
+
+
+registry = Registry(settings.METRICS_DIR)
+registry.prune()
+atexit.register(registry.flush)
+# Воркер, созданный fork, не должен второй раз выгрузить значения
+# родителя в свой файл.
+os.register_at_fork(after_in_child=registry.reset)
+
+request_duration = registry.histogram(
+    'yatube_request_duration_seconds', 'Время ответа по представлениям.',
+    ['view']
+)
+db_queries = registry.histogram(
+    'yatube_db_queries', 'Число запросов к базе за один ответ.', ['view'],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, math.inf)
+)
+db_duration = registry.histogram(
+    'yatube_db_duration_seconds', 'Время запросов к базе за один ответ.',
+    ['view']
+)
+template_duration = registry.histogram(
+    'yatube_template_render_seconds', 'Время рендеринга шаблонов.',
+    ['template']
+)
+fragment_cache = registry.counter(
+    'yatube_fragment_cache_lookups', 'Обращения к кэшу фрагментов шаблонов.',
+    ['fragment', 'result']
+)
+thumbnail_lookups = registry.counter(
+    'yatube_thumbnail_lookups', 'Поиск миниатюр в KV-хранилище.',
+    ['result']
+)
+thumbnail_duration = registry.histogram(
+    'yatube_thumbnail_seconds', 'Время создания одной миниатюры.',
+    ['geometry']
+)
@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from . import compression, metrics, profiling
+from .queries import QueryBudgetExceeded, QueryLog, logger
+from .routers import pinned, wrote
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class PrimaryPinMiddleware:
+    """Закрепляет за основной базой запросы, которые пишут, и запросы
+    клиента, который недавно писал (cookie PRIMARY_PIN_COOKIE)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned_token = pinned.set(
+            request.method not in SAFE_METHODS
+            or settings.PRIMARY_PIN_COOKIE in request.COOKIES
+        )
+        wrote_token = wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if wrote.get():
+                response.set_cookie(
+                    settings.PRIMARY_PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                    samesite='Lax'
+                )
+            return response
+        finally:
+            pinned.reset(pinned_token)
+            wrote.reset(wrote_token)
+
+
+class QueryCountMiddleware:
+    """Считает запросы к базе и их время для каждого представления.
+
+    Добавляет заголовок Server-Timing и метрики core.metrics, пишет в лог
+    медленные (дольше QUERY_SLOW_MS) и повторяющиеся запросы с местом
+    вызова и проверяет бюджет запросов из QUERY_BUDGETS. При
+    QUERY_BUDGET_RAISE превышение бюджета — исключение, иначе
+    предупреждение в лог.
+
+    Место вызова запроса ищется обходом стека, поэтому вне DEBUG — только
+    для медленных запросов и запросов сверх бюджета. Server-Timing
+    получают только INTERNAL_IPS и сотрудники.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with QueryLog(
+            locate=settings.DEBUG, slow_ms=settings.QUERY_SLOW_MS
+        ) as log:
+            request.query_log = log
+            response = self.get_response(request)
+        total = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        label = view_name if match else 'unresolved'
+        metrics.request_duration.observe(total / 1000, view=label)
+        metrics.db_queries.observe(log.count, view=label)
+        metrics.db_duration.observe(log.duration / 1000, view=label)
+        if self.internal(request):
+            response['Server-Timing'] = (
+                f'db;dur={log.duration:.1f};desc="{log.count} queries", '
+                f'total;dur={total:.1f}'
+            )
+        for query in log.slow(settings.QUERY_SLOW_MS):
+            logger.warning(
+                'Медленный запрос в %s (%.1f мс, %s): %s', view_name,
+                query.duration, query.where or '?', query.sql
+            )
+        for query, times in log.duplicates().items():
+            logger.warning(
+                'Запрос повторён %s раз в %s (%s): %s', times, view_name,
+                query.where or '?', query.sql
+            )
+        budget = settings.QUERY_BUDGETS.get(view_name) if match else None
+        if budget is not None and log.count > budget:
+            message = (
+                f'{view_name}: {log.count} запросов при бюджете {budget}'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Бюджет известен только после разрешения URL.
+        request.query_log.budget = settings.QUERY_BUDGETS.get(
+            request.resolver_match.view_name
+        )
+
+    @staticmethod
+    def internal(request):
+        if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+
+class SamplingProfilerMiddleware:
+    """Профилирует каждый PROFILER_SAMPLE_RATE-й (в среднем) запрос и
+    запросы с подписанным заголовком PROFILER_HEADER.
+
+    Стеки собирает поток core.profiling.sampler и складывает по имени
+    представления. Без PROFILER_ENABLED middleware отключается при
+    старте и ничего не стоит.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def wanted(self, request):
+        token = request.META.get(settings.PROFILER_HEADER)
+        if token is not None:
+            return profiling.check_token(token)
+        rate = settings.PROFILER_SAMPLE_RATE
+        return bool(rate) and random.randrange(rate) == 0
+
+    def __call__(self, request):
+        if not self.wanted(request):
+            return self.get_response(request)
+        thread_id = threading.get_ident()
+        profiling.sampler.start(thread_id)
+        try:
+            return self.get_response(request)
+        finally:
+            stacks = profiling.sampler.stop(thread_id)
+            match = request.resolver_match
+            profiling.profiles.add(
+                match.view_name if match else 'unresolved', stacks
+            )
+
+
+class CompressionMiddleware:
+    """Минифицирует HTML (HTML_MINIFY) и сжимает текстовые ответы в br
+    (если установлен brotli) или gzip по Accept-Encoding.
+
+    Картинки и другие уже сжатые типы, ответы короче COMPRESS_MIN_LENGTH
+    и ответы с Cache-Control: no-transform не трогает. Страницы
+    с CSRF-токеном уязвимы для BREACH: сам токен Django маскирует заново
+    в каждом ответе, а к такой странице перед сжатием добавляется
+    комментарий случайной длины. При COMPRESS_CSRF_PAGES = False такие
+    страницы не сжимаются вовсе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not compression.compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        html = response['Content-Type'].startswith('text/html')
+        if html and settings.HTML_MINIFY and not response.streaming:
+            response.content = compression.minify(
+                response.content.decode(response.charset)
+            ).encode(response.charset)
+            response['Content-Length'] = str(len(response.content))
+        encoding = compression.choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        if request.META.get('CSRF_COOKIE_USED'):
+            if not settings.COMPRESS_CSRF_PAGES:
+                return response
+            if html and not response.streaming:
+                response.content += compression.padding().encode()
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(
+                response.streaming_content, encoding
+            )
+            del response['Content-Length']
+        else:
+            compressed = compression.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                response['Content-Length'] = str(len(response.content))
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # Сжатое тело отличается побайтно, но не по смыслу.
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,135 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'core.profiling'
+
+
+def make_token():
+    """Подписанное значение заголовка, которое включает профилирование
+    запроса независимо от PROFILER_SAMPLE_RATE."""
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+def check_token(token):
+    try:
+        signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def collapse(frame):
+    """Стек в формате flamegraph: функции от корня к листу через ';'."""
+    names = []
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{frame.f_code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Поток, который раз в interval секунд снимает стеки потоков,
+    обрабатывающих профилируемые запросы.
+
+    Пока таких запросов нет, поток ждёт события и не просыпается.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.active = {}
+        self.thread = None
+
+    def start(self, thread_id):
+        with self.lock:
+            self.active[thread_id] = Counter()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='profiler', daemon=True
+                )
+                self.thread.start()
+        self.wakeup.set()
+
+    def stop(self, thread_id):
+        """Стеки, собранные для потока с момента start."""
+        with self.lock:
+            return self.active.pop(thread_id, Counter())
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            for thread_id, stacks in self.active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[collapse(frame)] += 1
+
+    def run(self):
+        while True:
+            if not self.active:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            self.sample()
+            time.sleep(self.interval)
+
+
+class Profiles:
+    """Стеки профилированных запросов, собранные по представлениям."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stacks = defaultdict(Counter)
+        self.requests = Counter()
+
+    def add(self, view_name, stacks):
+        with self.lock:
+            self.stacks[view_name].update(stacks)
+            self.requests[view_name] += 1
+        if settings.PROFILER_DIR:
+            self.dump(view_name, stacks)
+
+    def dump(self, view_name, stacks):
+        """Дописывает стеки в PROFILER_DIR/<view_name>.folded; flamegraph.pl
+        и speedscope суммируют одинаковые строки сами."""
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        path = os.path.join(
+            settings.PROFILER_DIR, view_name.replace(':', '.') + '.folded'
+        )
+        with open(path, 'a') as file:
+            file.write(folded(stacks))
+
+    def summary(self):
+        with self.lock:
+            return sorted(
+                (view_name, self.requests[view_name], sum(stacks.values()))
+                for view_name, stacks in self.stacks.items()
+            )
+
+    def folded(self, view_name):
+        with self.lock:
+            return folded(self.stacks.get(view_name, Counter()))
+
+    def clear(self):
+        with self.lock:
+            self.stacks.clear()
+            self.requests.clear()
+
+
+def folded(stacks):
+    return ''.join(
+        f'{stack} {count}\n' for stack, count in sorted(stacks.items())
+    )
+
+
+sampler = Sampler(settings.PROFILER_INTERVAL)
+profiles = Profiles()
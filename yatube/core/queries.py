@@ -0,0 +1,110 @@
+import logging
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+Query = namedtuple('Query', 'sql params alias duration where')
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление сделало больше запросов, чем задано в QUERY_BUDGETS."""
+
+
+def template_line():
+    """Откуда выполнен запрос: строка шаблона, если запрос случился при
+    рендеринге, иначе ближайшая строка кода проекта."""
+    frame = sys._getframe(1)
+    project_line = None
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            if hasattr(node, 'token'):
+                origin = node.origin
+                name = origin.template_name or origin.name
+                return f'{name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if project_line is None and filename.startswith(
+            settings.BASE_DIR
+        ) and not filename.startswith(os.path.dirname(__file__)):
+            project_line = (
+                f'{os.path.relpath(filename, settings.BASE_DIR)}'
+                f':{frame.f_lineno}'
+            )
+        frame = frame.f_back
+    return project_line
+
+
+class QueryLog:
+    """Запросы ко всем базам, выполненные внутри with QueryLog().
+
+    Работает через execute_wrapper, поэтому не требует DEBUG = True.
+    Место вызова (обход стека) ищется только при locate, для запросов
+    дольше slow_ms и для запросов сверх бюджета budget, иначе where —
+    None.
+    """
+
+    def __init__(self, locate=True, slow_ms=None, budget=None):
+        self.queries = []
+        self.stack = ExitStack()
+        self.locate = locate
+        self.slow_ms = slow_ms
+        self.budget = budget
+
+    def __enter__(self):
+        for alias in connections:
+            self.stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.queries.append(Query(
+                sql, params, context['connection'].alias, duration,
+                template_line() if self.wanted(duration) else None
+            ))
+
+    def wanted(self, duration):
+        """Нужно ли искать место вызова для только что выполненного
+        запроса."""
+        return (
+            self.locate
+            or self.slow_ms is not None and duration > self.slow_ms
+            or self.budget is not None and len(self.queries) >= self.budget
+        )
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """Общее время запросов в миллисекундах."""
+        return sum(query.duration for query in self.queries)
+
+    def slow(self, threshold):
+        return [query for query in self.queries if query.duration > threshold]
+
+    def duplicates(self):
+        """Запросы с одинаковыми SQL и параметрами: {query: повторов}."""
+        counts = Counter(
+            (query.sql, repr(query.params)) for query in self.queries
+        )
+        first = {}
+        for query in self.queries:
+            first.setdefault((query.sql, repr(query.params)), query)
+        return {
+            first[key]: times for key, times in counts.items() if times > 1
+        }
@@ -0,0 +1,47 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Читать с основной базы до конца текущего запроса: он уже писал или
+# пришёл сразу после записи (см. core.middleware.PrimaryPinMiddleware).
+pinned = ContextVar('pinned', default=False)
+# Запрос что-то записал — ответ должен закрепить клиента за основной базой.
+# None — вне PrimaryPinMiddleware (потоки миниатюр, команды manage.py):
+# там запись никого не закрепляет, и сбросить закрепление было бы некому.
+wrote = ContextVar('wrote', default=None)
+
+
+class ReplicaRouter:
+    """Запись — в основную базу default, чтение — в одну из реплик из
+    DATABASE_REPLICAS.
+
+    После записи клиент на REPLICA_PIN_SECONDS читает с основной базы,
+    чтобы увидеть собственный пост, комментарий или подписку, даже если
+    реплика ещё не догнала основную базу. Без реплик всё идёт в default.
+
+    Для локальной проверки реплика — второй файл SQLite:
+    DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': 'replica.sqlite3', 'TEST': {'MIRROR': 'default'}} и
+    DATABASE_REPLICAS = ['replica'].
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or pinned.get():
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if wrote.get() is not None:
+            pinned.set(True)
+            wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что и в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит из основной базы вместе с данными.
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,26 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    """Шаблон, время рендеринга которого попадает в метрики."""
+
+    def render(self, context=None, request=None):
+        name = self.origin.template_name or 'string'
+        with metrics.template_duration.time(template=name):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд DjangoTemplates, который замеряет рендеринг шаблонов."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -1,4 +1,33 @@
-from django.test import TestCase
+import gzip
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import reverse
+
+from posts.models import Comment, Post, User, UserCounters
+from posts.utils import CachedCount
+
+from . import compression, profiling
+from .cache import SQLiteCache
+from .metrics import Registry, registry
+from .middleware import CompressionMiddleware
+from .queries import QueryBudgetExceeded, QueryLog
+from .routers import ReplicaRouter
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +35,568 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLitePragmasTest(TestCase):
+    def test_connection_is_tuned(self):
+        """Соединение с SQLite получает PRAGMA из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    """Основная база — тестовая база default, реплика — отдельный файл
+    SQLite. «Репликация» — копирование строк в реплику вручную."""
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        connections.ensure_defaults('replica')
+        connections.prepare_test_settings('replica')
+        replica = connections['replica']
+        replica.ensure_connection()
+        connection.ensure_connection()
+        connection.connection.backup(replica.connection)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        del connections._connections.replica
+        shutil.rmtree(cls.directory)
+
+    def replicate(self, *objects):
+        for obj in objects:
+            type(obj)._default_manager.using('replica').bulk_create([obj])
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client.force_login(self.user)
+        # Записи вне запроса не закрепляют чтение: читаем из основной явно.
+        self.replicate(
+            self.user,
+            UserCounters.objects.using('default').get(user=self.user),
+            self.post,
+            Session.objects.using('default').get(
+                pk=self.client.session.session_key
+            )
+        )
+        self.POST_DETAIL_URL = reverse(
+            'posts:post_detail', args=[self.post.id]
+        )
+
+    def test_reads_go_to_replica(self):
+        """Чтение идёт в реплику и не видит записей после копирования."""
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Только в основной'
+        )
+        response = self.client.get(self.POST_DETAIL_URL)
+        self.assertNotContains(response, 'Только в основной')
+        self.assertNotIn(settings.PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_read_your_writes_after_comment(self):
+        """После записи клиент читает из основной базы, пока жив cookie."""
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'Мой комментарий'}
+        )
+        pin = response.cookies[settings.PRIMARY_PIN_COOKIE]
+        self.assertEqual(pin['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertContains(
+            self.client.get(self.POST_DETAIL_URL), 'Мой комментарий'
+        )
+        del self.client.cookies[settings.PRIMARY_PIN_COOKIE]
+        cache.clear()
+        self.assertNotContains(
+            self.client.get(self.POST_DETAIL_URL), 'Мой комментарий'
+        )
+
+    def test_follow_pins_to_primary(self):
+        """Подписка (GET-запрос) тоже закрепляет клиента за основной
+        базой."""
+        author = User.objects.create_user(username='author')
+        self.replicate(author)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=[author.username])
+        )
+        self.assertIn(settings.PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_write_outside_request_does_not_pin(self):
+        """Запись вне запроса (команды, фоновые потоки) не закрепляет
+        последующее чтение за основной базой."""
+        Post.objects.create(author=self.user, text='Из команды')
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'replica')
+
+    def test_replica_reads_cached_briefly(self):
+        """Страница и счётчик, прочитанные из реплики, кэшируются не
+        дольше REPLICA_PIN_SECONDS, из основной базы — как обычно."""
+        cache.clear()
+        with mock.patch.object(cache, 'set') as cache_set:
+            CachedCount('count').count(Post.objects.all())
+        cache_set.assert_called_once_with(
+            'count', 1, settings.REPLICA_PIN_SECONDS
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['cache_timeout'], settings.REPLICA_PIN_SECONDS
+        )
+        self.client.cookies[settings.PRIMARY_PIN_COOKIE] = '1'
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['cache_timeout'], settings.INDEX_CACHE_TIMEOUT
+        )
+
+
+class QueryCountMiddlewareTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит число запросов и их время."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$'
+        )
+
+    def test_server_timing_only_for_internal(self):
+        """Посторонним Server-Timing не отдаётся, сотрудникам — да."""
+        url = reverse('posts:index')
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertNotIn('Server-Timing', response)
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(DEBUG=False, QUERY_SLOW_MS=1000)
+    def test_stack_walked_only_when_needed(self):
+        """Вне DEBUG место вызова ищется только сверх бюджета."""
+        for budgets, walked in (
+            ({'posts:index': 100}, False),
+            ({'posts:index': 0}, True),
+        ):
+            with self.subTest(budgets=budgets), override_settings(
+                QUERY_BUDGETS=budgets, QUERY_BUDGET_RAISE=False
+            ), mock.patch('core.middleware.logger'), mock.patch(
+                'core.queries.template_line'
+            ) as template_line:
+                cache.clear()
+                self.client.get(reverse('posts:index'))
+                self.assertEqual(template_line.called, walked)
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_RAISE=True
+    )
+    def test_budget_exceeded_raises(self):
+        """Превышение бюджета запросов — исключение."""
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'posts:index'):
+            self.client.get(reverse('posts:index'))
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_RAISE=False
+    )
+    def test_budget_exceeded_logs(self):
+        """Без QUERY_BUDGET_RAISE превышение бюджета только пишется в лог."""
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('при бюджете 0', '\n'.join(logs.output))
+
+    def test_duplicates_point_to_template_line(self):
+        """Повторяющиеся запросы находятся вместе со строкой шаблона."""
+        template = Template('{{ posts.count }}\n{{ posts.count }}')
+        with QueryLog() as log:
+            template.render(Context({'posts': Post.objects.all()}))
+        (query, times), = log.duplicates().items()
+        self.assertEqual(times, 2)
+        self.assertIn('COUNT', query.sql)
+        self.assertTrue(query.where.endswith(':1'))
+
+    @override_settings(QUERY_SLOW_MS=-1)
+    def test_slow_queries_logged(self):
+        """Медленные запросы пишутся в лог с местом вызова."""
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('Медленный запрос в posts:index', logs.output[0])
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def test_metrics_endpoint(self):
+        """/metrics отдаёт время ответа, запросы, шаблоны и кэш
+        фрагментов."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        for line in (
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            'yatube_db_queries_count{view="posts:index"} 2',
+            'yatube_template_render_seconds_count'
+            '{template="posts/index.html"} 2',
+            'yatube_fragment_cache_lookups_total'
+            '{fragment="index_page",result="miss"} 1',
+            'yatube_fragment_cache_lookups_total'
+            '{fragment="index_page",result="hit"} 1',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+
+    def test_metrics_need_token(self):
+        """Метрики видны только с токеном METRICS_TOKEN, адрес не важен."""
+        for token, headers in (
+            ('secret', {}),
+            ('secret', {'HTTP_AUTHORIZATION': 'Bearer wrong'}),
+            ('secret', {'HTTP_AUTHORIZATION': 'Basic secret'}),
+            (None, {'HTTP_AUTHORIZATION': 'Bearer '}),
+        ):
+            with self.subTest(token=token, headers=headers), (
+                override_settings(METRICS_TOKEN=token)
+            ):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, 403)
+
+    def test_prune_removes_dead_processes(self):
+        """При старте удаляются файлы завершившихся процессов и свой
+        файл от прежнего процесса с тем же pid."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        process = multiprocessing.Process(target=int)
+        process.start()
+        process.join()
+        for pid in (os.getppid(), process.pid, os.getpid()):
+            with open(os.path.join(directory, f'{pid}.json'), 'w') as file:
+                file.write('{}')
+        Registry(directory).prune()
+        self.assertEqual(os.listdir(directory), [f'{os.getppid()}.json'])
+
+    def test_processes_share_directory(self):
+        """Значения процессов суммируются через общий каталог."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = Registry(directory)
+        counter = worker.counter('hits', 'Попадания.', ['page'])
+        counter.inc(page='index')
+        worker.flush()
+        # Файл «другого процесса» со значением 1.
+        os.rename(
+            os.path.join(directory, f'{os.getpid()}.json'),
+            os.path.join(directory, 'other.json')
+        )
+        counter.inc(2, page='index')
+        self.assertIn('hits_total{page="index"} 4', worker.render())
+
+
+@override_settings(PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=0)
+class SamplingProfilerTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        profiling.profiles.clear()
+        self.stacks = Counter({'posts.views:index;django:render': 3})
+
+    def test_sampler_collects_thread_stack(self):
+        """Снимок стека потока попадает в его счётчик стеков."""
+        sampler = profiling.Sampler(interval=60)
+        thread_id = threading.get_ident()
+        sampler.start(thread_id)
+        sampler.sample()
+        stacks = sampler.stop(thread_id)
+        (stack, count), = stacks.items()
+        self.assertEqual(count, 1)
+        self.assertTrue(stack.endswith(
+            'core.tests:test_sampler_collects_thread_stack;'
+            'core.profiling:sample'
+        ))
+
+    def test_signed_header_profiles_request(self):
+        """Запрос с подписанным заголовком профилируется."""
+        with mock.patch.object(
+            profiling.sampler, 'stop', return_value=self.stacks
+        ):
+            self.client.get(
+                reverse('posts:index'), HTTP_X_PROFILE=profiling.make_token()
+            )
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE='bad')
+            self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            profiling.profiles.summary(), [('posts:index', 1, 3)]
+        )
+
+    def test_profiles_view(self):
+        """Стеки доступны администратору в формате flamegraph."""
+        profiling.profiles.add('posts:index', self.stacks)
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('profiles'))
+        self.assertContains(response, 'posts:index: 1 запросов')
+        response = self.client.get(
+            reverse('profiles'), {'view': 'posts:index'}
+        )
+        self.assertEqual(
+            response.content.decode(), 'posts.views:index;django:render 3\n'
+        )
+
+    def test_profiles_view_is_admin_only(self):
+        """Обычный пользователь не видит стеки."""
+        self.client.force_login(User.objects.create_user(username='user'))
+        response = self.client.get(reverse('profiles'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_dump_to_directory(self):
+        """С PROFILER_DIR стеки дописываются в файл представления."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(PROFILER_DIR=directory):
+            profiling.profiles.add('posts:index', self.stacks)
+            profiling.profiles.add('posts:index', self.stacks)
+        with open(os.path.join(directory, 'posts.index.folded')) as file:
+            self.assertEqual(
+                file.read(), 'posts.views:index;django:render 3\n' * 2
+            )
+
+
+def incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_get_set_add_delete(self):
+        """Базовые операции кэша."""
+        cache = self.make_cache()
+        cache.set('post', {'text': 'Тест'})
+        self.assertEqual(cache.get('post'), {'text': 'Тест'})
+        self.assertFalse(cache.add('post', 'другое'))
+        self.assertTrue(cache.add('new', 1))
+        self.assertEqual(cache.get_many(['post', 'new', 'missing']), {
+            'post': {'text': 'Тест'}, 'new': 1
+        })
+        cache.delete('post')
+        self.assertIsNone(cache.get('post'))
+        self.assertEqual(cache.get_or_set('missing', 5), 5)
+
+    def test_expired_value_is_missing(self):
+        """Просроченная запись не возвращается и не мешает add."""
+        cache = self.make_cache()
+        cache.set('key', 'value', timeout=0)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'new'))
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому с тем же файлом."""
+        self.make_cache().set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_incr(self):
+        """incr увеличивает целое и требует существующий ключ."""
+        cache = self.make_cache()
+        with self.assertRaises(ValueError):
+            cache.incr('counter')
+        cache.set('counter', 1, None)
+        self.assertEqual(cache.incr('counter', 2), 3)
+        self.assertEqual(cache.get('counter'), 3)
+        cache.set('float', 1.5)
+        self.assertEqual(cache.incr('float'), 2.5)
+
+    def test_incr_is_atomic_across_processes(self):
+        """Параллельные incr из разных процессов не теряются."""
+        self.make_cache().set('counter', 0, None)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=incr_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.make_cache().get('counter'), 200)
+
+    def test_least_recently_used_entries_are_culled(self):
+        """Сверх MAX_ENTRIES вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=2)
+        for index in range(4):
+            cache.set(f'key{index}', index)
+        cache.connection.execute(
+            "UPDATE cache SET accessed = 0 WHERE key != ':1:key0'"
+        )
+        cache.set('key4', 4)
+        self.assertEqual(cache.stats()['entries'], 3)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertEqual(cache.get('key4'), 4)
+
+    def test_get_does_not_take_write_lock(self):
+        """Чтение работает, пока другой процесс держит блокировку записи,
+        а время обращения пишется со следующей записью."""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=2)
+        for index in range(4):
+            cache.set(f'key{index}', index)
+        cache.connection.execute('UPDATE cache SET accessed = 0')
+        writer = sqlite3.connect(self.location, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            self.assertEqual(cache.get('key3'), 3)
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        cache.set('key4', 4)
+        self.assertEqual(cache.get('key3'), 3)
+        self.assertEqual(cache.stats()['entries'], 3)
+
+    def test_overwrites_keep_stats_exact(self):
+        """Перезапись ключей не сбивает счётчики записей и размера, и
+        после них кэш по-прежнему сохраняет новые записи."""
+        cache = self.make_cache(MAX_ENTRIES=100)
+        for index in range(250):
+            cache.set('key', 'x' * (index % 7))
+            cache.set(f'other{index % 3}', index)
+            cache.incr(f'other{index % 3}')
+        for index in range(20):
+            cache.set(f'new{index}', index)
+        entries, size = cache.connection.execute(
+            'SELECT COUNT(*), SUM(size) FROM cache'
+        ).fetchone()
+        self.assertEqual(cache.stats(), {'entries': entries, 'bytes': size})
+        self.assertEqual(entries, 24)
+
+    def test_stats_resynced_on_connect(self):
+        """Сбитые раньше счётчики исправляются при подключении."""
+        self.make_cache().set('key', 'value')
+        connection = sqlite3.connect(self.location, isolation_level=None)
+        connection.execute('UPDATE cache_stats SET entries = 500')
+        connection.close()
+        self.assertEqual(self.make_cache().stats()['entries'], 1)
+
+    def test_size_limit(self):
+        """Общий размер записей не превышает MAX_SIZE."""
+        cache = self.make_cache(MAX_SIZE=10000)
+        for index in range(20):
+            cache.set(f'key{index}', 'x' * 1000)
+        self.assertLessEqual(cache.stats()['bytes'], 10000)
+        self.assertIsNotNone(cache.get('key19'))
+
+
+class CompressionMiddlewareTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.middleware = CompressionMiddleware(lambda request: self.response)
+        self.request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+
+    def test_minify_keeps_raw_tags(self):
+        """Минификация не трогает pre, textarea и script."""
+        html = (
+            '<div>\n    <p>a</p>\n\n  </div>\n'
+            '<pre>\n  x\n\n</pre><textarea>\n y </textarea>'
+            '<script>\n  z\n</script>'
+        )
+        self.assertEqual(
+            compression.minify(html),
+            '<div>\n<p>a</p>\n</div>\n'
+            '<pre>\n  x\n\n</pre><textarea>\n y </textarea>'
+            '<script>\n  z\n</script>'
+        )
+
+    def test_choose_encoding(self):
+        """Кодировка выбирается по Accept-Encoding с учётом q."""
+        self.assertEqual(compression.choose_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(compression.choose_encoding('gzip;q=0, deflate'))
+        self.assertIsNone(compression.choose_encoding(''))
+        expected = 'br' if compression.brotli else 'gzip'
+        self.assertEqual(compression.choose_encoding('*'), expected)
+
+    def test_page_is_gzipped(self):
+        """Страница сжимается gzip и распаковывается в тот же HTML."""
+        plain = self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    @skipUnless(compression.brotli, 'brotli не установлен')
+    def test_page_is_brotli_compressed(self):
+        """При поддержке br страница сжимается brotli."""
+        plain = self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(
+            compression.brotli.decompress(response.content), plain.content
+        )
+
+    def test_skips_images_and_short_responses(self):
+        """Картинки и короткие ответы не сжимаются."""
+        for response in (
+            HttpResponse(b'x' * 1000, content_type='image/png'),
+            HttpResponse(b'short', content_type='text/plain'),
+        ):
+            self.response = response
+            with self.subTest(content_type=response['Content-Type']):
+                result = self.middleware(self.request)
+                self.assertFalse(result.has_header('Content-Encoding'))
+
+    def test_weak_etag(self):
+        """ETag сжатого ответа становится слабым."""
+        self.response = HttpResponse('x' * 1000, content_type='text/plain')
+        self.response['ETag'] = '"abc"'
+        response = self.middleware(self.request)
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    @override_settings(COMPRESS_CSRF_PAGES=False)
+    def test_csrf_pages_are_not_compressed(self):
+        """Без COMPRESS_CSRF_PAGES страницы с CSRF-токеном не сжимаются."""
+        self.response = HttpResponse('x' * 1000)
+        self.request.META['CSRF_COOKIE_USED'] = True
+        response = self.middleware(self.request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response(self):
+        """Потоковый ответ сжимается по кускам."""
+        chunks = [f'{index},{"y" * 100}\n' for index in range(50)]
+        self.response = StreamingHttpResponse(
+            iter(chunks), content_type='text/csv'
+        )
+        response = self.middleware(self.request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)).decode(),
+            ''.join(chunks)
+        )
@@ -1,4 +1,12 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import profiling
+from .metrics import registry
 
 
 def page_not_found(request, exception):
@@ -15,3 +23,37 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus."""
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(
+        ' '
+    )
+    if not settings.METRICS_TOKEN or scheme != 'Bearer' or not (
+        constant_time_compare(token, settings.METRICS_TOKEN)
+    ):
+        raise PermissionDenied
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
+
+
+@staff_member_required
+def profiles(request):
+    """Стеки профилированных запросов для flamegraph.pl или speedscope.
+
+    Без параметра view — список представлений и свежий токен для
+    заголовка PROFILER_HEADER.
+    """
+    view_name = request.GET.get('view')
+    if view_name is not None:
+        return HttpResponse(
+            profiling.profiles.folded(view_name), content_type='text/plain'
+        )
+    lines = [f'token: {profiling.make_token()}', '']
+    lines += [
+        f'{view_name}: {requests} запросов, {samples} снимков стека'
+        for view_name, requests, samples in profiling.profiles.summary()
+    ]
+    return HttpResponse('\n'.join(lines), content_type='text/plain')
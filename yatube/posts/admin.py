@@ -1,9 +1,51 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
 
-from .models import Comment, Follow, Group, Post
+from . import export, search
+from .models import Comment, Follow, Group, Post, UserCounters
 
 
-class PostAdmin(admin.ModelAdmin):
+class ExportMixin:
+    """Адрес export/ в разделе модели: потоковая выгрузка export_kind.
+
+    Параметры: format (jsonl или csv), author, group, since и until.
+    """
+    export_kind = None
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path(
+                'export/', self.admin_site.admin_view(self.export_view),
+                name='%s_%s_export' % info
+            ),
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get('format', 'jsonl')
+        if fmt not in export.FORMATS:
+            return HttpResponseBadRequest(f'Неизвестный формат {fmt}')
+        try:
+            lines = export.lines(self.export_kind, fmt, **{
+                name: request.GET.get(name)
+                for name in ('author', 'group', 'since', 'until')
+            })
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+        response = StreamingHttpResponse(
+            export.chunks(lines), content_type=export.CONTENT_TYPES[fmt]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.export_kind}.{fmt}"'
+        )
+        return response
+
+
+class PostAdmin(ExportMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -15,6 +57,12 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    export_kind = 'posts'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -24,7 +72,7 @@ class GroupAdmin(admin.ModelAdmin):
     )
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ExportMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -34,18 +82,37 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('post',)
     empty_value_display = '-пусто-'
+    export_kind = 'comments'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term, comments=True), False
 
-class FollowAdmin(admin.ModelAdmin):
+
+class FollowAdmin(ExportMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'user',
         'author'
     )
     search_fields = ('author',)
+    export_kind = 'follows'
+
+
+class UserCountersAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+        'followers_count',
+        'following_count'
+    )
+    readonly_fields = ('posts_count', 'followers_count', 'following_count')
+    search_fields = ('user__username',)
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(UserCounters, UserCountersAdmin)
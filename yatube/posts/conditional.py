@@ -0,0 +1,90 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from . import detail
+from .models import Group, User
+from .utils import changed_key, generations, lookup
+
+
+def viewer(request):
+    """Зритель для ETag. У авторизованного — ещё и CSRF-cookie: вход
+    меняет токен (rotate_token), и страница с формой из кэша браузера
+    со старым токеном получила бы 403 при отправке."""
+    user = request.user
+    if not user.is_authenticated:
+        return 'anon'
+    return (
+        f'user:{user.pk}:'
+        f'{request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")}'
+    )
+
+
+def conditional(names_of):
+    """condition() для страницы, которая зависит от поколений данных
+    names_of(request, *args, **kwargs) (см. utils.bump_generation).
+
+    ETag — хэш поколений, зрителя и адреса с параметрами, Last-Modified —
+    время последнего изменения этих данных. Оба считаются по кэшу, без
+    отрисовки страницы. Last-Modified отдаётся только гостям: у
+    авторизованного пользователя страница меняется и при входе или
+    выходе, а это время изменения данных не отражает. Пока с изменения
+    не прошла секунда, Last-Modified тоже нет: следующее изменение в ту
+    же секунду его бы не сдвинуло.
+    """
+
+    def names(request, *args, **kwargs):
+        if not hasattr(request, '_generations'):
+            request._generations = names_of(request, *args, **kwargs)
+        return request._generations
+
+    def etag(request, *args, **kwargs):
+        found = names(request, *args, **kwargs)
+        parts = [viewer(request), request.get_full_path()] + [
+            f'{name}={number}'
+            for name, number in generations(found).items()
+        ]
+        return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        found = names(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            return None
+        times = cache.get_many([changed_key(name) for name in found])
+        if len(times) < len(found):
+            return None
+        changed = max(times.values())
+        if time.time() - changed < 1:
+            return None
+        return datetime.fromtimestamp(changed, timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def index_names(request):
+    return ['posts']
+
+
+def group_names(request, slug):
+    group = lookup(request, Group.objects.all(), slug=slug)
+    return [f'group:{group.pk}']
+
+
+def profile_names(request, username):
+    author = lookup(
+        request, User.objects.select_related('counters'), username=username
+    )
+    return [f'author:{author.pk}', f'follows:{author.pk}']
+
+
+def post_names(request, post_id):
+    # Данные страницы поста обычно уже в кэше posts.detail.
+    return [f'post:{post_id}', *detail.entry(post_id)['generations']]
+
+
+def follow_names(request):
+    return ['posts', f'follows:{request.user.pk}']
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Follow, Post, User, UserCounters
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def bump(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на deltas.
+
+    Счётчик не уходит ниже нуля, даже если он отстал от данных
+    (например, после bulk_create без сигналов): rebuild это исправит.
+    """
+    UserCounters.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def count_of(model, field):
+    """Подзапрос: число строк model, где field ссылается на пользователя."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """Пересчитывает счётчики всех пользователей с нуля."""
+    users = User.objects.order_by('pk').annotate(
+        posts_total=count_of(Post, 'author'),
+        followers_total=count_of(Follow, 'author'),
+        following_total=count_of(Follow, 'user'),
+    ).values_list(
+        'pk', 'posts_total', 'followers_total', 'following_total'
+    )
+    rebuilt = 0
+    with transaction.atomic():
+        # Режим ленты (posts.feed.switch_mode) — не счётчик, его храним.
+        pulled = set(UserCounters.objects.filter(
+            feed_pulled=True).values_list('user_id', flat=True))
+        UserCounters.objects.all().delete()
+        batch = []
+        for pk, posts, followers, following in users.iterator():
+            batch.append(UserCounters(
+                user_id=pk, posts_count=posts,
+                followers_count=followers, following_count=following,
+                feed_pulled=pk in pulled,
+            ))
+            if len(batch) >= batch_size:
+                UserCounters.objects.bulk_create(batch)
+                rebuilt += len(batch)
+                batch = []
+        UserCounters.objects.bulk_create(batch)
+    return rebuilt + len(batch)
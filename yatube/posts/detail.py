@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from .models import Comment, Post
+from .utils import CommentPaginator, generations, read_timeout
+
+
+def detail_key(post_id):
+    """Ключ кэша данных страницы поста; сбрасывается сигналами правки
+    поста и его комментариев (см. posts.signals)."""
+    return f'posts:detail:{post_id}'
+
+
+def comments_of(post_id, cursor=None):
+    """Комментарии поста с авторами в том же запросе."""
+    return CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related(
+            'author').only('text', 'created', 'post', 'author__username'),
+        settings.COMMENTS_PAGE, cursor
+    )
+
+
+def dependencies(post, comments):
+    """Поколения данных, которые страница показывает помимо самого поста:
+    автор и его счётчик постов, группа и авторы комментариев."""
+    names = [f'author:{post.author_id}']
+    if post.group_id is not None:
+        names.append(f'group:{post.group_id}')
+    names += sorted({
+        f'author:{comment.author_id}' for comment in comments
+    } - set(names))
+    return generations(names)
+
+
+def entry(post_id):
+    """Пост с автором, его счётчиками и группой и первая страница
+    комментариев из кэша, а при промахе — двумя запросами к базе."""
+    key = detail_key(post_id)
+    cached = cache.get(key)
+    if cached is not None and cached['generations'] == dependencies(
+        cached['post'], cached['comments'][0]
+    ):
+        return cached
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id
+    )
+    comments = comments_of(post_id).window
+    cached = {
+        'post': post,
+        'comments': comments,
+        'generations': dependencies(post, comments[0]),
+    }
+    cache.set(
+        key, cached, read_timeout(Post, settings.POST_DETAIL_CACHE_TIMEOUT)
+    )
+    return cached
+
+
+def load(post_id, cursor=None):
+    """Пост и страница его комментариев по токену cursor."""
+    data = entry(post_id)
+    paginator = comments_of(post_id, cursor)
+    if paginator.cursor is None:
+        # Первая страница уже выбрана вместе с постом.
+        paginator.window = data['comments']
+    return data['post'], paginator.get_page()
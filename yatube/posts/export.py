@@ -0,0 +1,164 @@
+import csv
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Comment, Follow, Post
+
+BATCH_SIZE = 2000
+CHUNK_SIZE = 64 * 1024
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+FORMATS = tuple(CONTENT_TYPES)
+
+# Колонки выгрузки совпадают с тем, что читает load_posts: пользователи
+# записаны по username, группы — по slug, поэтому выгрузку можно сразу
+# загрузить в другую базу.
+KINDS = {
+    'posts': {
+        'model': Post,
+        'columns': {
+            'id': 'pk', 'author': 'author__username',
+            'group': 'group__slug', 'text': 'text',
+            'pub_date': 'pub_date', 'image': 'image',
+        },
+        'filters': {
+            'author': 'author__username', 'group': 'group__slug',
+            'date': 'pub_date',
+        },
+    },
+    'comments': {
+        'model': Comment,
+        'columns': {
+            'id': 'pk', 'post': 'post_id', 'author': 'author__username',
+            'text': 'text', 'created': 'created',
+        },
+        'filters': {
+            'author': 'author__username', 'group': 'post__group__slug',
+            'date': 'created',
+        },
+    },
+    'follows': {
+        'model': Follow,
+        'columns': {'user': 'user__username', 'author': 'author__username'},
+        'filters': {'author': 'author__username'},
+    },
+}
+
+
+def parse_moment(value):
+    """Дата или дата со временем из строки ISO 8601."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'неверная дата {value!r}')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def queryset(kind, author=None, group=None, since=None, until=None):
+    """Строки выгрузки kind с фильтрами; since включительно, until — нет.
+
+    Неподдерживаемый для kind фильтр — ValueError.
+    """
+    spec = KINDS[kind]
+    lookups = {}
+    for name, value, lookup in (
+        ('author', author, ''), ('group', group, ''),
+        ('date', since, '__gte'), ('date', until, '__lt'),
+    ):
+        if not value:
+            continue
+        if name not in spec['filters']:
+            raise ValueError(f'{kind}: фильтр {name} не поддерживается')
+        if name == 'date':
+            value = parse_moment(value)
+        lookups[spec['filters'][name] + lookup] = value
+    return spec['model'].objects.filter(**lookups).values_list(
+        'pk', *spec['columns'].values()
+    )
+
+
+def check_batch_size(batch_size):
+    # При нуле срез [:0] всегда пуст, и выгрузка не закончилась бы.
+    if batch_size < 1:
+        raise ValueError(f'batch_size должен быть не меньше 1: {batch_size}')
+
+
+def rows(kind, found, batch_size=BATCH_SIZE):
+    """Строки выгрузки словарями, пачками по первичному ключу.
+
+    Каждая пачка — отдельный короткий запрос WHERE id > последнего
+    ORDER BY id LIMIT batch_size, поэтому память не зависит от размера
+    таблицы, а чтение не держит одну долгую транзакцию на всю выгрузку.
+    """
+    check_batch_size(batch_size)
+    names = list(KINDS[kind]['columns'])
+    found = found.order_by('pk')
+    last = None
+    while True:
+        batch = found if last is None else found.filter(pk__gt=last)
+        count = 0
+        for pk, *values in batch[:batch_size].iterator(
+            chunk_size=batch_size
+        ):
+            last = pk
+            count += 1
+            yield dict(zip(names, values))
+        if count < batch_size:
+            return
+
+
+class Echo:
+    """Файл для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(kind, found_rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(KINDS[kind]['columns'])
+    for row in found_rows:
+        yield writer.writerow(
+            '' if value is None else value for value in row.values()
+        )
+
+
+def jsonl_lines(kind, found_rows):
+    for row in found_rows:
+        line = json.dumps(row, ensure_ascii=False, cls=DjangoJSONEncoder)
+        yield f'{line}\n'
+
+
+def lines(kind, fmt, batch_size=BATCH_SIZE, **filters):
+    """Выгрузка kind построчно в формате fmt.
+
+    Ошибки в фильтрах и batch_size — ValueError сразу, до первой строки.
+    """
+    check_batch_size(batch_size)
+    found = queryset(kind, **filters)
+    encode = csv_lines if fmt == 'csv' else jsonl_lines
+    return encode(kind, rows(kind, found, batch_size))
+
+
+def chunks(found_lines, size=CHUNK_SIZE):
+    """Склеивает строки в куски около size символов: серверу дешевле
+    отправить один кусок, чем тысячи коротких строк."""
+    buffer, length = [], 0
+    for line in found_lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.utils.functional import cached_property
+
+from .models import FeedEntry, Follow, Post, UserCounters
+from .utils import NEXT, CursorPaginator, keyset_slice
+
+
+def is_pulled(author_id):
+    """Посты автора подмешиваются в ленты при чтении, а не при записи."""
+    return UserCounters.objects.filter(
+        user_id=author_id, feed_pulled=True
+    ).exists()
+
+
+def add_entries(posts, user_ids):
+    """Раскладывает посты по лентам пользователей пачками."""
+    batch = []
+    for user_id in user_ids:
+        for post in posts:
+            batch.append(FeedEntry(
+                user_id=user_id, post_id=post.pk, pub_date=post.pub_date
+            ))
+            if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+                FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    add_entries([post], Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True).iterator())
+
+
+def recent_posts(author_id, limit=None):
+    """Посты автора для раскладки: последние limit или все при None."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').only('pk', 'pub_date')
+    return posts if limit is None else posts[:limit]
+
+
+def backfill(user_id, author_id, limit=None):
+    """Добавляет в ленту пользователя посты автора после подписки:
+    последние limit (в запросе подписки) или все (rebuild)."""
+    if is_pulled(author_id):
+        return
+    add_entries(recent_posts(author_id, limit).iterator(), [user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def switch_mode(author_id):
+    """Переводит автора на чтение при числе подписчиков больше
+    FEED_FANOUT_MAX_FOLLOWERS и обратно на запись при
+    FEED_FANOUT_PUSH_FOLLOWERS и меньше.
+
+    Разрыв между порогами не даёт автору переключаться туда и обратно
+    на каждой подписке. При возврате на запись последние
+    FEED_FANOUT_BACKFILL_POSTS постов автора заново раскладываются по
+    лентам всех подписчиков: пока он был на чтении, FeedEntry для его
+    постов не создавались. Всё остальное возвращает rebuild_feed.
+    """
+    found = UserCounters.objects.filter(user_id=author_id)
+    state = found.values_list('followers_count', 'feed_pulled').first()
+    if state is None:
+        return
+    followers, pulled = state
+    if not pulled and followers > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        found.update(feed_pulled=True)
+        FeedEntry.objects.filter(post__author_id=author_id).delete()
+    elif pulled and followers <= settings.FEED_FANOUT_PUSH_FOLLOWERS:
+        found.update(feed_pulled=False)
+        add_entries(
+            list(recent_posts(
+                author_id, settings.FEED_FANOUT_BACKFILL_POSTS
+            )),
+            Follow.objects.filter(author_id=author_id).values_list(
+                'user_id', flat=True).iterator()
+        )
+
+
+def rebuild():
+    """Перестраивает все ленты с нуля по текущим подпискам."""
+    FeedEntry.objects.all().delete()
+    UserCounters.objects.update(feed_pulled=False)
+    UserCounters.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).update(feed_pulled=True)
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+class FeedPaginator(CursorPaginator):
+    """Лента подписок: диапазон по индексу (user, pub_date) в FeedEntry.
+
+    Посты авторов с большим числом подписчиков в FeedEntry не попадают;
+    их страница выбирается отдельным keyset-запросом и сливается
+    с основной по ключу (pub_date, id).
+    """
+
+    def __init__(self, object_list, per_page, cursor=None,
+                 count_provider=None, user=None):
+        super().__init__(object_list, per_page, cursor, count_provider)
+        self.user = user
+
+    @cached_property
+    def pulled_authors(self):
+        return list(Follow.objects.filter(
+            user=self.user,
+            author__counters__feed_pulled=True
+        ).values_list('author_id', flat=True))
+
+    def fetch(self, key, direction, limit):
+        entries = keyset_slice(
+            FeedEntry.objects.filter(user=self.user).order_by(
+                '-pub_date', '-post_id'),
+            key, direction, id_field='post_id'
+        )
+        post_ids = list(entries.values_list('post_id', flat=True)[:limit])
+        posts = Post.objects.for_listing()
+        found = posts.in_bulk(post_ids)
+        rows = [found[pk] for pk in post_ids if pk in found]
+        if self.pulled_authors:
+            rows += keyset_slice(
+                posts.filter(author__in=self.pulled_authors).order_by(
+                    '-pub_date', '-id'),
+                key, direction
+            )[:limit]
+            rows = list({post.pk: post for post in rows}.values())
+            rows.sort(
+                key=lambda post: (post.pub_date, post.pk),
+                reverse=direction == NEXT
+            )
+        return rows[:limit]
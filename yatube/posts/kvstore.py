@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+
+from django.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+from core import metrics
+
+# Сколько ключей искать одним запросом (лимит переменных SQLite — 999).
+LOOKUP_BATCH_SIZE = 500
+
+
+class SharedKVStore(KVStoreBase):
+    """KV-хранилище sorl-thumbnail в отдельном файле SQLite.
+
+    Файл общий для всех процессов и потоков сервера, поэтому метаданные
+    миниатюр не ищутся в основной базе и не дублируются в LocMemCache
+    каждого процесса. Журнал WAL позволяет читать параллельно с записью.
+    Путь — THUMBNAIL_KVSTORE_PATH; файл не должен лежать в MEDIA_ROOT,
+    иначе его можно скачать. При потере файла sorl заново находит уже
+    созданные миниатюры.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+
+    @property
+    def path(self):
+        return settings.THUMBNAIL_KVSTORE_PATH
+
+    @property
+    def connection(self):
+        """Соединение текущего потока; после fork или смены пути
+        открывается заново."""
+        state = (os.getpid(), self.path)
+        if getattr(self.local, 'state', None) != state:
+            old = getattr(self.local, 'connection', None)
+            if old is not None and self.local.state[0] == state[0]:
+                # Соединение, открытое до fork, закрывает родитель.
+                old.close()
+            self.local.connection = self.connect(state[1])
+            self.local.state = state
+        return self.local.connection
+
+    def connect(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(
+            path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS kvstore '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID'
+        )
+        return connection
+
+    def count(self, hits, misses):
+        """Попадания и промахи поиска миниатюр — в core.metrics."""
+        if hits:
+            metrics.thumbnail_lookups.inc(hits, result='hit')
+        if misses:
+            metrics.thumbnail_lookups.inc(misses, result='miss')
+
+    def get(self, image_file):
+        found = super().get(image_file)
+        self.count(found is not None, found is None)
+        return found
+
+    def get_many(self, image_files):
+        """Словарь {key: ImageFile} для найденных файлов — одним запросом
+        на LOOKUP_BATCH_SIZE ключей."""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        raw_keys = list(keys)
+        found = {}
+        for start in range(0, len(raw_keys), LOOKUP_BATCH_SIZE):
+            batch = raw_keys[start:start + LOOKUP_BATCH_SIZE]
+            rows = self.connection.execute(
+                'SELECT key, value FROM kvstore WHERE key IN ({})'.format(
+                    ', '.join('?' * len(batch))
+                ), batch
+            )
+            for raw_key, value in rows:
+                found[keys[raw_key]] = deserialize_image_file(value)
+        self.count(len(found), len(keys) - len(found))
+        return found
+
+    def _get_raw(self, key):
+        row = self.connection.execute(
+            'SELECT value FROM kvstore WHERE key = ?', (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_raw(self, key, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+            (key, value)
+        )
+
+    def _delete_raw(self, *keys):
+        self.connection.executemany(
+            'DELETE FROM kvstore WHERE key = ?', [(key,) for key in keys]
+        )
+
+    def _find_keys_raw(self, prefix):
+        rows = self.connection.execute(
+            "SELECT key FROM kvstore WHERE key LIKE ? ESCAPE '\\'",
+            (prefix.replace('\\', '\\\\').replace('%', '\\%')
+             .replace('_', '\\_') + '%',)
+        )
+        return [key for key, in rows]
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии или подписки в JSONL или CSV. '
+        'Строки читаются пачками по первичному ключу, поэтому память не '
+        'зависит от размера таблицы. Выгрузку читает load_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=export.KINDS)
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='jsonl'
+        )
+        parser.add_argument('--author', help='username автора.')
+        parser.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--since', help='Не раньше этой даты (ISO 8601, включительно).'
+        )
+        parser.add_argument(
+            '--until', help='Раньше этой даты (ISO 8601, не включительно).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=export.BATCH_SIZE,
+            help='Сколько строк читать за один запрос.'
+        )
+        parser.add_argument(
+            '--output', help='Файл выгрузки (по умолчанию stdout).'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            lines = export.lines(
+                options['kind'], options['format'],
+                batch_size=options['batch_size'], author=options['author'],
+                group=options['group'], since=options['since'],
+                until=options['until'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        if options['output']:
+            with open(
+                options['output'], 'w', newline='', encoding='utf-8'
+            ) as file:
+                file.writelines(lines)
+            return
+        for line in lines:
+            self.stdout.write(line, ending='')
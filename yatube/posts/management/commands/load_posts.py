@@ -0,0 +1,315 @@
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.bulk import batches, explicit_dates
+from posts import counters, feed, search
+from posts.models import Comment, Follow, Group, Post, User
+
+# Порядок загрузки: сначала то, на что ссылаются остальные.
+KINDS = ('users', 'groups', 'posts', 'comments', 'follows')
+MAX_REPORTED_ERRORS = 20
+# Сколько id подставлять в один запрос pk__in (лимит параметров SQLite).
+MAX_QUERY_IDS = 900
+
+
+def read_rows(path):
+    """Строки файла JSONL или CSV в виде словарей."""
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+@contextmanager
+def deferred_indexes(*models):
+    """Снимает неуникальные индексы и триггеры поискового индекса
+    с таблиц models на время загрузки и создаёт их заново после неё.
+
+    SQLite строит индекс по заполненной таблице за один проход, а не
+    перестраивает его на каждой вставке. Уникальные индексы остаются:
+    на них держатся ignore_conflicts и целостность данных.
+    """
+    if connection.vendor != 'sqlite' or not models:
+        yield
+        return
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT type, name, sql FROM sqlite_master '
+            f'WHERE tbl_name IN ({", ".join(["%s"] * len(tables))}) '
+            "AND sql IS NOT NULL AND (type = 'trigger' OR "
+            "(type = 'index' AND sql NOT LIKE 'CREATE UNIQUE%%'))",
+            tables
+        )
+        deferred = cursor.fetchall()
+        for kind, name, _ in deferred:
+            cursor.execute(f'DROP {kind.upper()} "{name}"')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, _, sql in deferred:
+                cursor.execute(sql)
+        search.rebuild()
+
+
+class Loader:
+    """Превращает строки файлов в объекты моделей.
+
+    Пользователи и группы ищутся по username и slug через словари
+    в памяти. Первичные ключи новых строк выдаются здесь же, начиная
+    с максимального в базе, поэтому после bulk_create их не нужно
+    перечитывать. Пост из файла получает id = id в файле + сдвиг
+    (максимальный id поста до загрузки), и комментарии ссылаются на него
+    по id из файла без словаря на миллионы записей. Если файла постов
+    в загрузке нет, сдвиг нулевой и id в комментариях — id постов в базе.
+    """
+
+    def __init__(self):
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.last_pk = {
+            model: model.objects.aggregate(last=Max('pk'))['last'] or 0
+            for model in (User, Group, Post)
+        }
+        self.post_offset = 0
+        self.now = timezone.now()
+        self.password = make_password(None)
+
+    def allocate(self, model):
+        self.last_pk[model] += 1
+        return self.last_pk[model]
+
+    def date(self, value):
+        if not value:
+            return self.now
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f'неверная дата {value!r}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def user_id(self, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            raise LookupError(f'нет пользователя {username!r}') from None
+
+    def users_row(self, row, number):
+        if row['username'] in self.users:
+            return None
+        pk = self.allocate(User)
+        self.users[row['username']] = pk
+        return User(
+            pk=pk, username=row['username'],
+            first_name=row.get('first_name') or '',
+            last_name=row.get('last_name') or '',
+            email=row.get('email') or '',
+            password=row.get('password') or self.password,
+            date_joined=self.date(row.get('date_joined')),
+        )
+
+    def groups_row(self, row, number):
+        if row['slug'] in self.groups:
+            return None
+        pk = self.allocate(Group)
+        self.groups[row['slug']] = pk
+        return Group(
+            pk=pk, slug=row['slug'], title=row['title'],
+            description=row.get('description') or '',
+        )
+
+    def posts_row(self, row, number):
+        slug = row.get('group')
+        if slug and slug not in self.groups:
+            raise LookupError(f'нет группы {slug!r}')
+        pk = self.post_offset + int(row.get('id') or number)
+        self.last_pk[Post] = max(self.last_pk[Post], pk)
+        return Post(
+            pk=pk, text=row['text'],
+            author_id=self.user_id(row['author']),
+            group_id=self.groups[slug] if slug else None,
+            pub_date=self.date(row.get('pub_date')),
+            image=row.get('image') or '',
+        )
+
+    def comments_row(self, row, number):
+        return Comment(
+            post_id=self.post_offset + int(row['post']),
+            author_id=self.user_id(row['author']),
+            text=row['text'],
+            created=self.date(row.get('created')),
+        )
+
+    def follows_row(self, row, number):
+        user_id = self.user_id(row['user'])
+        author_id = self.user_id(row['author'])
+        return Follow(user_id=user_id, author_id=author_id) if (
+            user_id != author_id
+        ) else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из файлов JSONL или CSV. Вид данных задаёт имя файла: users, '
+        'groups, posts, comments или follows (например, posts.jsonl). '
+        'Пользователи в файлах ссылаются по username, группы — по slug. '
+        'Комментарии ссылаются на посты по id из файла постов, если он '
+        'есть в той же загрузке, иначе — по id поста в базе; комментарии '
+        'к несуществующим постам пропускаются как ошибки. Загрузка выдаёт '
+        'первичные ключи сама, поэтому во время неё в базу не должен '
+        'писать никто другой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы для загрузки.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять за один запрос и транзакцию.'
+        )
+        parser.add_argument(
+            '--keep-indexes', action='store_true',
+            help='Не снимать индексы постов и комментариев на время '
+                 'загрузки.'
+        )
+
+    def files(self, paths):
+        files = []
+        for path in paths:
+            kind = os.path.basename(path).split('.')[0]
+            if kind not in KINDS:
+                raise CommandError(
+                    f'{path}: имя файла должно начинаться с одного из '
+                    f'{", ".join(KINDS)}'
+                )
+            files.append((KINDS.index(kind), kind, path))
+        return [(kind, path) for _, kind, path in sorted(files)]
+
+    def error(self, path, number, error, stats):
+        stats['errors'] += 1
+        if stats['errors'] <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'{path}:{number}: {error!r}')
+
+    def objects(self, loader, kind, path, stats):
+        """Пары (номер строки, объект модели) по строкам файла; плохие
+        строки пропускаются."""
+        convert = getattr(loader, f'{kind}_row')
+        for number, row in enumerate(read_rows(path), 1):
+            try:
+                instance = convert(row, number)
+            except (KeyError, LookupError, ValueError) as error:
+                self.error(path, number, error, stats)
+                continue
+            if instance is None:
+                stats['skipped'] += 1
+                continue
+            yield number, instance
+
+    def existing_posts(self, batch, path, stats):
+        """Комментарии пачки, чьи посты есть в базе.
+
+        Иначе отложенная проверка внешнего ключа уронила бы всю загрузку
+        при коммите пачки, когда предыдущие пачки уже сохранены.
+        """
+        wanted = {comment.post_id for _, comment in batch}
+        found = set()
+        for ids in batches(wanted, MAX_QUERY_IDS):
+            found.update(
+                Post.objects.filter(pk__in=ids).values_list('pk', flat=True)
+            )
+        kept = []
+        for number, comment in batch:
+            if comment.post_id in found:
+                kept.append((number, comment))
+            else:
+                self.error(
+                    path, number,
+                    LookupError(f'нет поста {comment.post_id}'), stats
+                )
+        return kept
+
+    def load(self, loader, kind, path, batch_size, stats):
+        model = {
+            'users': User, 'groups': Group, 'posts': Post,
+            'comments': Comment, 'follows': Follow,
+        }[kind]
+        if kind == 'posts':
+            loader.post_offset = loader.last_pk[Post]
+        loaded = 0
+        started = time.monotonic()
+        for batch in batches(
+            self.objects(loader, kind, path, stats), batch_size
+        ):
+            if model is Comment:
+                batch = self.existing_posts(batch, path, stats)
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        [instance for _, instance in batch],
+                        ignore_conflicts=model is Follow
+                    )
+            except DatabaseError as error:
+                raise CommandError(
+                    f'{path}: пачка после {loaded} строк не загружена: '
+                    f'{error}'
+                )
+            loaded += len(batch)
+        elapsed = time.monotonic() - started
+        rate = loaded / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{path}: {loaded} строк за {elapsed:.1f} с '
+            f'({rate:.0f} в секунду)'
+        )
+        return loaded
+
+    def handle(self, *args, **options):
+        files = self.files(options['paths'])
+        loader = Loader()
+        stats = {'errors': 0, 'skipped': 0}
+        loaded = 0
+        started = time.monotonic()
+        deferred = (
+            deferred_indexes() if options['keep_indexes']
+            else deferred_indexes(Post, Comment)
+        )
+        with deferred, explicit_dates(
+            Post._meta.get_field('pub_date'),
+            Comment._meta.get_field('created'),
+        ):
+            for kind, path in files:
+                loaded += self.load(
+                    loader, kind, path, options['batch_size'], stats
+                )
+        # bulk_create не отправляет сигналов: счётчики, ленты и кэш
+        # приводим в порядок одним проходом после загрузки.
+        counters.rebuild()
+        if settings.FEED_FANOUT:
+            feed.rebuild()
+        cache.clear()
+        elapsed = time.monotonic() - started
+        rate = loaded / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Пропущено существующих: {stats["skipped"]}, '
+            f'ошибок: {stats["errors"]}'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {loaded} за {elapsed:.1f} с '
+            f'({rate:.0f} в секунду)'
+        ))
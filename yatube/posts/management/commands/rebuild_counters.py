@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок всех пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=counters.REBUILD_BATCH_SIZE,
+            help='Сколько строк счётчиков вставлять за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = counters.rebuild(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано счётчиков: {rebuilt}')
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+from posts.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает таблицу ленты подписок FeedEntry.'
+
+    def handle(self, *args, **options):
+        feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'
+        ))
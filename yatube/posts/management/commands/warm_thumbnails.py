@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import time
+from itertools import islice
+
+import django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def init_worker():
+    """Готовит процесс пула: Django и свои соединения с базой."""
+    django.setup()
+    connections.close_all()
+
+
+def warm(task):
+    """Создаёт недостающие миниатюры одной картинки в процессе пула."""
+    pk, image_name, names = task
+    try:
+        if not default_storage.exists(image_name):
+            return pk, 0, f'нет исходного файла {image_name}'
+        created = thumbnails.create(image_name, names)
+    except Exception as error:
+        return pk, 0, f'{type(error).__name__}: {error}'
+    if created < len(names):
+        return pk, created, f'создано {created} из {len(names)} миниатюр'
+    thumbnails.forget_failure(image_name)
+    return pk, created, None
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт все миниатюры из POST_THUMBNAILS для картинок постов. '
+        'Уже созданные миниатюры пропускаются, поэтому прерванный прогон '
+        'можно просто запустить заново.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; 1 — создавать в текущем процессе.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=16,
+            help='Сколько картинок отдавать процессу за раз.'
+        )
+        parser.add_argument(
+            '--start-id', type=int, default=0,
+            help='Начать с поста с этим id (для продолжения прогона).'
+        )
+
+    def tasks(self, start_id, stats):
+        """Картинки постов, у которых не хватает миниатюр."""
+        posts = (
+            Post.objects.exclude(image='').filter(pk__gte=start_id)
+            .order_by('pk').values_list('pk', 'image', 'author', 'group')
+        )
+        for pk, image_name, author_id, group_id in posts.iterator():
+            stats['posts'] += 1
+            names = thumbnails.missing(image_name)
+            if not names:
+                stats['skipped'] += 1
+                continue
+            stats['feeds'][pk] = (author_id, group_id)
+            yield pk, image_name, names
+
+    def handle(self, *args, **options):
+        stats = {'posts': 0, 'skipped': 0, 'feeds': {}}
+        tasks = self.tasks(options['start_id'], stats)
+        started = time.monotonic()
+        if options['processes'] > 1:
+            connections.close_all()
+            with multiprocessing.Pool(
+                options['processes'], initializer=init_worker
+            ) as pool:
+                # Картинки ищутся в KV-хранилище пачками по мере работы,
+                # а не все до начала прогона.
+                batch_size = options['processes'] * options['chunk_size']
+                results = []
+                while True:
+                    batch = list(islice(tasks, batch_size))
+                    if not batch:
+                        break
+                    results += pool.imap_unordered(
+                        warm, batch, chunksize=options['chunk_size']
+                    )
+        else:
+            results = [warm(task) for task in tasks]
+        elapsed = time.monotonic() - started
+
+        created = 0
+        failed = []
+        for pk, count, error in sorted(results):
+            created += count
+            if error is not None:
+                failed.append(pk)
+                self.stderr.write(f'Пост {pk}: {error}')
+        # Кэш лент сбрасывается один раз за прогон, а не на каждый пост.
+        thumbnails.invalidate({
+            pk: feed for pk, feed in stats['feeds'].items()
+            if pk not in failed
+        })
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Картинок: {stats["posts"]}, уже готовы: {stats["skipped"]}, '
+            f'ошибок: {len(failed)}'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано миниатюр: {created} за {elapsed:.1f} с '
+            f'({rate:.1f} в секунду)'
+        ))
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+POST_ROW = '{row}.id * 2'
+COMMENT_ROW = '{row}.id * 2 + 1'
+
+TRIGGERS = (
+    ('post', 'posts_post', POST_ROW, '{row}.id'),
+    ('comment', 'posts_comment', COMMENT_ROW, '{row}.post_id'),
+)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    statements = [
+        "CREATE VIRTUAL TABLE posts_search USING fts5("
+        "body, post_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+    ]
+    for name, table, rowid, post_id in TRIGGERS:
+        insert = (
+            'INSERT INTO posts_search(rowid, body, post_id) '
+            f'VALUES ({rowid}, new.text, {post_id});'
+        ).format(row='new')
+        delete = (
+            f'DELETE FROM posts_search WHERE rowid = {rowid};'
+        ).format(row='old')
+        statements += [
+            f'CREATE TRIGGER posts_search_{name}_ai AFTER INSERT ON {table} '
+            f'BEGIN {insert} END',
+            f'CREATE TRIGGER posts_search_{name}_au '
+            f'AFTER UPDATE OF text ON {table} BEGIN {delete} {insert} END',
+            f'CREATE TRIGGER posts_search_{name}_ad AFTER DELETE ON {table} '
+            f'BEGIN {delete} END',
+        ]
+    statements += [
+        'INSERT INTO posts_search(rowid, body, post_id) '
+        'SELECT id * 2, text, id FROM posts_post',
+        'INSERT INTO posts_search(rowid, body, post_id) '
+        'SELECT id * 2 + 1, text, post_id FROM posts_comment',
+    ]
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, *_ in TRIGGERS:
+        for suffix in ('ai', 'au', 'ad'):
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS posts_search_{name}_{suffix}'
+            )
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
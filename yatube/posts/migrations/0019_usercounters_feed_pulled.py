@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    # До этой миграции режим автора определялся текущим числом подписчиков.
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='feed_pulled',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
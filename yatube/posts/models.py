@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -23,7 +23,29 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class AtomicSave:
+    """save() в одной транзакции с обработчиками post_save: счётчики
+    UserCounters (posts.signals) меняются вместе с записью или не
+    меняются вовсе. Удаление Django и так выполняет в транзакции вместе
+    с post_delete."""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class PostQuerySet(models.QuerySet):
+
+    def for_listing(self):
+        """Посты для лент: автор и группа одним JOIN, без лишних колонок."""
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        )
+
+
+class Post(AtomicSave, models.Model):
     TEXT_LENGTH = 15
     text = models.TextField(
         verbose_name='Текст поста',
@@ -53,6 +75,8 @@ class Post(models.Model):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         default_related_name = 'posts'
         ordering = ['-pub_date']
@@ -89,12 +113,15 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [models.Index(
+            fields=['post', '-created', '-id'], name='comment_post_created_idx'
+        )]
 
     def __str__(self):
         return self.text[:self.TEXT_LENGTH]
 
 
-class Follow(models.Model):
+class Follow(AtomicSave, models.Model):
     user = models.ForeignKey(
         User, related_name='follower', on_delete=models.CASCADE,
         verbose_name='Пользователь'
@@ -110,3 +137,51 @@ class Follow(models.Model):
         verbose_name_plural = 'Лента авторов'
         constraints = [models.UniqueConstraint(
             fields=['user', 'author'], name='unique_members')]
+
+
+class UserCounters(models.Model):
+    user = models.OneToOneField(
+        User, primary_key=True, related_name='counters',
+        on_delete=models.CASCADE, verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок'
+    )
+    feed_pulled = models.BooleanField(
+        default=False, verbose_name='Посты подмешиваются в ленты при чтении'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User, related_name='feed_entries', on_delete=models.CASCADE,
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post, related_name='feed_entries', on_delete=models.CASCADE,
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [models.Index(
+            fields=['user', '-pub_date', '-post'], name='feed_user_date_idx'
+        )]
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'post'], name='unique_feed_entry')]
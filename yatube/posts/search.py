@@ -0,0 +1,103 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .utils import NEXT, CursorPaginator
+
+# Полнотекстовый индекс SQLite FTS5 по текстам постов и комментариев.
+# rowid = id * 2 для поста и id * 2 + 1 для комментария; post_id — пост,
+# к которому относится запись. Индекс поддерживают триггеры из миграции
+# 0017_search_index, так что он не отстаёт даже после bulk_create и
+# update().
+SEARCH_TABLE = 'posts_search'
+
+REBUILD_SQL = (
+    f'DELETE FROM {SEARCH_TABLE}',
+    f'INSERT INTO {SEARCH_TABLE}(rowid, body, post_id) '
+    'SELECT id * 2, text, id FROM posts_post',
+    f'INSERT INTO {SEARCH_TABLE}(rowid, body, post_id) '
+    'SELECT id * 2 + 1, text, post_id FROM posts_comment',
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')",
+)
+
+RANKED_SQL = (
+    'SELECT post_id, score FROM ('
+    'SELECT post_id, MIN(rank) AS score FROM ('
+    f'SELECT post_id, rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    ') GROUP BY post_id'
+    ') {where} ORDER BY score {order}, post_id {id_order} LIMIT %s'
+)
+
+
+def match_expression(query):
+    """FTS5-выражение: все слова запроса, каждое ищется как префикс."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def matching(queryset, query, comments=False):
+    """Фильтрует посты или комментарии queryset по индексу."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid / 2 FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 2 = %s',
+        [expression, int(comments)]
+    ))
+
+
+def rebuild():
+    """Заполняет индекс заново по всем постам и комментариям."""
+    with connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+        cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по релевантности с keyset-пагинацией.
+
+    Пост находится по своему тексту или по тексту комментариев к нему;
+    ключ страницы — пара (bm25, id), где меньший bm25 лучше.
+    """
+
+    def __init__(self, object_list, per_page, cursor=None,
+                 count_provider=None, query=''):
+        super().__init__(object_list, per_page, cursor, count_provider)
+        self.expression = match_expression(query)
+
+    def key_of(self, post):
+        return post.search_score, post.pk
+
+    def parse_key(self, value):
+        return value if isinstance(value, (int, float)) else None
+
+    def fetch(self, key, direction, limit):
+        if not self.expression:
+            return []
+        params = [self.expression]
+        where = ''
+        if key is not None:
+            sign = '>' if direction == NEXT else '<'
+            where = (
+                f'WHERE score {sign} %s OR '
+                f'(score = %s AND post_id {"<" if sign == ">" else ">"} %s)'
+            )
+            params += [key[0], key[0], key[1]]
+        sql = RANKED_SQL.format(
+            where=where,
+            order='ASC' if direction == NEXT else 'DESC',
+            id_order='DESC' if direction == NEXT else 'ASC',
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            ranked = cursor.fetchall()
+        found = self.object_list.in_bulk([pk for pk, _ in ranked])
+        rows = []
+        for pk, score in ranked:
+            if pk in found:
+                found[pk].search_score = score
+                rows.append(found[pk])
+        return rows
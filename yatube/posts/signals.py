@@ -0,0 +1,159 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import counters, detail, feed, thumbnails
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .utils import bump_generation, count_key
+
+
+# Поля пользователя, которые выводятся рядом с его постами и комментариями.
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+def drop_post_counts(author_id, *group_ids):
+    """Сбрасывает закэшированные счётчики списков, где есть пост автора."""
+    keys = [count_key('all'), count_key('author', author_id)]
+    keys += [count_key('group', pk) for pk in group_ids if pk is not None]
+    keys += [
+        count_key('feed', user_id) for user_id in Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)
+    ]
+    cache.delete_many(keys)
+
+
+def drop_post_pages(author_id, *group_ids):
+    """Сбрасывает кэш страниц профиля автора и групп поста."""
+    bump_generation(f'author:{author_id}')
+    for pk in set(group_ids) - {None}:
+        bump_generation(f'group:{pk}')
+
+
+def group_authors(group):
+    return list(Post.objects.filter(group=group).order_by().values_list(
+        'author_id', flat=True).distinct())
+
+
+def drop_follow_pages(follow):
+    """Подписка меняет счётчики в профилях обоих пользователей и ленту
+    подписчика."""
+    bump_generation(f'follows:{follow.user_id}')
+    bump_generation(f'follows:{follow.author_id}')
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    instance._old_group_id = (
+        Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if created:
+        counters.bump(instance.author_id, posts_count=1)
+        if settings.FEED_FANOUT:
+            feed.fan_out(instance)
+    if created or old_group_id != instance.group_id:
+        drop_post_counts(instance.author_id, instance.group_id, old_group_id)
+    drop_post_pages(instance.author_id, instance.group_id, old_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, posts_count=-1)
+    drop_post_counts(instance.author_id, instance.group_id)
+    drop_post_pages(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump(instance.author_id, followers_count=1)
+        counters.bump(instance.user_id, following_count=1)
+        if settings.FEED_FANOUT:
+            feed.switch_mode(instance.author_id)
+            feed.backfill(
+                instance.user_id, instance.author_id,
+                settings.FEED_FANOUT_BACKFILL_POSTS
+            )
+    cache.delete(count_key('feed', instance.user_id))
+    drop_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, followers_count=-1)
+    counters.bump(instance.user_id, following_count=-1)
+    if settings.FEED_FANOUT:
+        feed.prune(instance.user_id, instance.author_id)
+        feed.switch_mode(instance.author_id)
+    cache.delete(count_key('feed', instance.user_id))
+    drop_follow_pages(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Имя автора выводится в списках постов и на страницах постов с его
+    комментариями: при правке имени их кэш сбрасывается. Вход в систему
+    (update_fields=['last_login']) ничего не сбрасывает."""
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+        return
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+    bump_generation('posts')
+    drop_post_pages(instance.pk, *Post.objects.filter(
+        author=instance, group__isnull=False
+    ).order_by().values_list('group_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def posts_changed(sender, **kwargs):
+    bump_generation('posts')
+    cache.delete(thumbnails.FIRST_PAGE_KEY)
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_authors(sender, instance, **kwargs):
+    # После удаления у постов уже group = NULL (SET_NULL без сигналов Post).
+    instance._author_ids = group_authors(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, created=False, **kwargs):
+    """Название и slug группы выводятся и на главной, и в профилях
+    авторов её постов: их кэш сбрасывается вместе с кэшем группы."""
+    bump_generation(f'group:{instance.pk}')
+    if created:
+        return
+    author_ids = getattr(instance, '_author_ids', None)
+    if author_ids is None:
+        author_ids = group_authors(instance)
+    bump_generation('posts')
+    for author_id in author_ids:
+        bump_generation(f'author:{author_id}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_detail_changed(sender, instance, **kwargs):
+    cache.delete(detail.detail_key(instance.pk))
+    bump_generation(f'post:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    cache.delete(detail.detail_key(instance.post_id))
+    bump_generation(f'post:{instance.post_id}')
@@ -0,0 +1,16 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(post, name='post'):
+    return thumbnails.ready_thumbnail(post, name)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, name='post'):
+    thumbnails.prefetch(posts, name)
+    return ''
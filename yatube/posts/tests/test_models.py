@@ -1,6 +1,16 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
 from django.test import TestCase
 
-from ..models import Comment, Follow, Group, Post, User
+from .. import search
+from ..models import Comment, Follow, Group, Post, User, UserCounters
 
 
 class PostModelTest(TestCase):
@@ -87,3 +97,122 @@ class PostModelTest(TestCase):
                 with self.subTest(field=field):
                     self.assertEqual(
                         model._meta.get_field(field).help_text, value)
+
+
+class UserCountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_counters_follow_posts_and_follows(self):
+        """Счётчики меняются при создании и удалении постов и подписок."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        post.delete()
+        follow.delete()
+        pairs = [
+            (self.counters(self.author).posts_count, 0),
+            (self.counters(self.author).followers_count, 0),
+            (self.counters(self.reader).following_count, 0),
+        ]
+        for value, expected in pairs:
+            with self.subTest(value=value):
+                self.assertEqual(value, expected)
+
+    def test_counters_change_with_the_write(self):
+        """Ошибка при обновлении счётчиков откатывает и сам пост."""
+        with mock.patch(
+            'posts.signals.counters.bump', side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                Post.objects.create(author=self.author, text='Пост')
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """rebuild_counters пересчитывает отставшие счётчики."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(3)
+        )
+        UserCounters.objects.all().delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.author).posts_count, 3)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+
+
+class LoadPostsCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        User.objects.create_user(username='existing')
+
+    def write(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            if name.endswith('.csv'):
+                file.write('\n'.join(rows) + '\n')
+            else:
+                file.writelines(json.dumps(row) + '\n' for row in rows)
+        return path
+
+    def test_load_posts_command(self):
+        """load_posts загружает связанные данные из JSONL и CSV."""
+        paths = [
+            self.write('follows.jsonl', [
+                {'user': 'reader', 'author': 'existing'},
+                {'user': 'reader', 'author': 'existing'},
+            ]),
+            self.write('comments.jsonl', [
+                {'post': 2, 'author': 'reader', 'text': 'Комментарий'},
+                {'post': 99, 'author': 'reader', 'text': 'К чужому посту'},
+            ]),
+            self.write('posts.jsonl', [
+                {'id': 1, 'author': 'existing', 'text': 'Первый пост',
+                 'group': 'cats', 'pub_date': '2020-01-02T03:04:05'},
+                {'id': 2, 'author': 'reader', 'text': 'Второй пост'},
+                {'id': 3, 'author': 'nobody', 'text': 'Без автора'},
+            ]),
+            self.write('groups.csv', [
+                'slug,title,description', 'cats,Кошки,Про кошек',
+            ]),
+            self.write('users.jsonl', [
+                {'username': 'reader', 'first_name': 'Читатель'},
+                {'username': 'existing'},
+            ]),
+        ]
+        out, err = StringIO(), StringIO()
+        call_command('load_posts', *paths, batch_size=1, stdout=out,
+                     stderr=err)
+        first = Post.objects.get(text='Первый пост')
+        comment = Comment.objects.get()
+        reader = User.objects.get(username='reader')
+        pairs = [
+            (User.objects.count(), 2),
+            (Post.objects.count(), 2),
+            (Follow.objects.count(), 1),
+            (first.group.slug, 'cats'),
+            (first.pub_date.year, 2020),
+            (comment.post.text, 'Второй пост'),
+            (comment.author, reader),
+            (reader.counters.following_count, 1),
+            (reader.counters.posts_count, 1),
+        ]
+        for value, expected in pairs:
+            with self.subTest(expected=expected):
+                self.assertEqual(value, expected)
+        self.assertIn("'nobody'", err.getvalue())
+        self.assertIn('нет поста', err.getvalue())
+        self.assertIn('Загружено строк: 7', out.getvalue())
+        self.assertTrue(search.matching(Post.objects, 'первый').exists())
+        Post.objects.create(author=reader, text='Пост после загрузки')
+        self.assertTrue(search.matching(Post.objects, 'после').exists())
@@ -51,6 +51,10 @@ class TaskURLTests(TestCase):
         cls.POST_COMMENT_URL = reverse(
             'posts:add_comment',
             args=[cls.post.id])
+        cls.POST_COMMENTS = f'/posts/{cls.post.id}/comments/'
+        cls.POST_COMMENTS_URL = reverse(
+            'posts:comments',
+            args=[cls.post.id])
         cls.POST_FOLLOW = f'/profile/{cls.user.username}/follow/'
         cls.POST_FOLLOW_URL = reverse(
             'posts:profile_follow',
@@ -69,6 +73,7 @@ class TaskURLTests(TestCase):
             self.POST_DETAIL: self.POST_DETAIL_URL,
             self.POST_EDIT: self.POST_EDIT_URL,
             self.POST_COMMENT: self.POST_COMMENT_URL,
+            self.POST_COMMENTS: self.POST_COMMENTS_URL,
             FOLLOW: FOLLOW_URL,
             self.POST_FOLLOW: self.POST_FOLLOW_URL,
             self.POST_UNFOLLOW: self.POST_UNFOLLOW_URL
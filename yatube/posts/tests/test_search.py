@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+
+SEARCH_URL = reverse('posts:search')
+RANGE_POSTS = 13
+
+
+class SearchViewTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Кошка спит на диване'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Собака гуляет во дворе'
+        )
+        Comment.objects.create(
+            author=cls.user, post=cls.other, text='А где же кошка?'
+        )
+        cls.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(SEARCH_URL, {'q': query, **params})
+        return response.context['page_obj']
+
+    def test_search_posts_and_comments(self):
+        """Поиск находит посты по тексту и по комментариям."""
+        mapping = {
+            'кошка': {self.post, self.other},
+            'СОБАК': {self.other},
+            'диване': {self.post},
+            'кошка диване': {self.post},
+            'жираф': set(),
+            '': set(),
+        }
+        for query, expected in mapping.items():
+            with self.subTest(query=query):
+                self.assertEqual(set(self.search(query)), expected)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        Post.objects.filter(pk=self.post.pk).update(text='Попугай')
+        self.assertEqual(list(self.search('попугай')), [self.post])
+        self.assertNotIn(self.post, self.search('диване'))
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(list(self.search('попугай')), [])
+
+    def test_search_pages(self):
+        """Результаты поиска листаются по cursor без повторов."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Енот номер {i}')
+            for i in range(RANGE_POSTS)
+        )
+        first = self.search('енот')
+        second = self.search('енот', cursor=first.paginator.next_cursor)
+        self.assertEqual(len(first), settings.PAGINATE_PAGE)
+        self.assertEqual(len(second), RANGE_POSTS - settings.PAGINATE_PAGE)
+        self.assertTrue(set(first).isdisjoint(second))
+        back = self.search('енот', cursor=second.paginator.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        mapping = {
+            reverse('admin:posts_post_changelist'): 1,
+            reverse('admin:posts_comment_changelist'): 1,
+        }
+        for url, count in mapping.items():
+            with self.subTest(url=url):
+                response = client.get(url, {'q': 'кошка'})
+                self.assertEqual(response.context['cl'].result_count, count)
+
+    def test_rebuild_search_index_command(self):
+        """rebuild_search_index заполняет индекс заново."""
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(set(self.search('кошка')), {self.post, self.other})
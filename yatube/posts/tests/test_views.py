@@ -1,13 +1,27 @@
+import base64
+import json
+import os
 import shutil
+import sqlite3
 import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from sorl.thumbnail import default
 
-from ..models import Follow, Post, Group, User
+from core import metrics
+
+from .. import export, feed, thumbnails, utils
+from ..models import Comment, FeedEntry, Follow, Post, Group, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -109,22 +123,86 @@ class PostViewsTest(TestCase):
 
     def test_cache_context(self):
         """Проверка кэширования страницы index"""
+        # Первый запрос создаёт миниатюры и сбрасывает кэш ленты.
+        self.authorized_client.get(INDEX_URL)
         response = self.authorized_client.get(INDEX_URL)
         first_item_before = response.content
-        form_data = {
-            'text': 'Тестовый текст',
-        }
-        response = self.authorized_client.post(
-            CREATE_POST_URL,
-            data=form_data,
-            follow=True
-        )
-        after_create_post = self.authorized_client.get(INDEX_URL)
-        first_item_after = after_create_post.content
-        self.assertEqual(first_item_after, first_item_before)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        after_update = self.authorized_client.get(INDEX_URL)
+        self.assertEqual(after_update.content, first_item_before)
         cache.clear()
         after_clear = self.authorized_client.get(INDEX_URL)
-        self.assertNotEqual(first_item_after, after_clear)
+        self.assertNotEqual(after_clear.content, first_item_before)
+
+    def test_cache_invalidated_by_new_post(self):
+        """Новый пост сразу виден на закэшированной главной."""
+        self.authorized_client.get(INDEX_URL)
+        self.authorized_client.post(
+            CREATE_POST_URL, data={'text': 'Свежий пост'}, follow=True
+        )
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_group_and_profile_cache_invalidation(self):
+        """Кэш группы и профиля сбрасывается только их постами."""
+        other = Group.objects.create(title='other', slug='other')
+        urls = (self.GROUP_LIST_URL, self.PROFILE_URL)
+        before = [self.authorized_client.get(url).content for url in urls]
+        stranger = User.objects.create_user(username='stranger')
+        Post.objects.create(text='Чужой пост', author=stranger, group=other)
+        for url, content in zip(urls, before):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.content, content)
+                self.assertFalse(any(
+                    'FROM "posts_post"' in query['sql']
+                    for query in queries.captured_queries
+                ))
+        Post.objects.create(
+            text='Новый пост группы', author=self.user, group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.authorized_client.get(url), 'Новый пост группы'
+                )
+
+    def test_group_change_invalidates_index_and_profile(self):
+        """Переименование и удаление группы видны на главной и в профиле
+        автора её поста."""
+        urls = (INDEX_URL, self.PROFILE_URL)
+        for url in urls:
+            self.authorized_client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.authorized_client.get(url), 'Новое название'
+                )
+        group.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.authorized_client.get(url), self.GROUP_LIST_URL
+                )
+
+    def test_cache_varies_by_page(self):
+        """Разные страницы главной кэшируются под разными ключами."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.user)
+            for i in range(settings.PAGINATE_PAGE)
+        )
+        cache.clear()
+        first = self.authorized_client.get(INDEX_URL)
+        second = self.authorized_client.get(
+            INDEX_URL,
+            {'cursor': first.context['page_obj'].paginator.next_cursor}
+        )
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, 'Тестовый пост')
 
 
 class PaginatorViewsTest(TestCase):
@@ -177,6 +255,103 @@ class PaginatorViewsTest(TestCase):
                         len(response.context['page_obj']), count_page
                     )
 
+    def test_cursor_pages(self):
+        """Проверка: переходы по cursor вперёд и назад."""
+        pages = (
+            INDEX_URL,
+            self.PROFILE_URL,
+            self.GROUP_LIST_URL,
+            FOLLOW_INDEX_URL
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                first = self.follower_client.get(page).context['page_obj']
+                second = self.follower_client.get(
+                    page, {'cursor': first.paginator.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    len(second), Post.objects.count() - settings.PAGINATE_PAGE
+                )
+                self.assertEqual(second.number, 2)
+                self.assertFalse(second.has_next())
+                self.assertTrue(set(first).isdisjoint(second))
+                back = self.follower_client.get(
+                    page, {'cursor': second.paginator.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_cursor_page_queries(self):
+        """Страница по cursor не делает COUNT и OFFSET."""
+        first = self.follower_client.get(FOLLOW_INDEX_URL)
+        cursor = first.context['page_obj'].paginator.next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.follower_client.get(FOLLOW_INDEX_URL, {'cursor': cursor})
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_page_count_is_cached(self):
+        """Число постов берётся из кэша и сбрасывается новым постом."""
+        cache.clear()
+        page = INDEX_URL + '?page=2'
+        self.follower_client.get(page)
+        with CaptureQueriesContext(connection) as queries:
+            self.follower_client.get(page)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.follower_client.get(page)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            RANGE_POSTS + 1
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый cursor приводит на первую страницу."""
+        response = self.follower_client.get(INDEX_URL, {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_out_of_range_cursor_shows_first_page(self):
+        """Курсор с огромными или неположительными числами — тоже битый."""
+        date = '"2020-01-01T00:00:00+00:00"'
+        pages = (
+            (INDEX_URL, {}),
+            (self.PROFILE_URL, {}),
+            (reverse('posts:search'), {'q': 'Тестовый'}),
+            (reverse('posts:comments', args=[Post.objects.first().pk]), {}),
+        )
+        for raw in (
+            f'["n", {date}, 1, 1e999]',
+            f'["n", {date}, 1e999, 2]',
+            f'["n", {date}, {10 ** 27}, 2]',
+            f'["n", {date}, 1, 0]',
+            f'["n", {date}, -5, 2]',
+        ):
+            cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+            for url, params in pages:
+                with self.subTest(raw=raw, url=url):
+                    response = self.follower_client.get(
+                        url, {**params, 'cursor': cursor}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    page = response.context.get('page_obj')
+                    if page is not None:
+                        self.assertEqual(page.number, 1)
+
+    def test_page_cache_key_uses_decoded_cursor(self):
+        """Ключ кэша страницы строится из разобранного курсора; страница
+        по битому курсору не кэшируется."""
+        cursor = self.follower_client.get(
+            INDEX_URL).context['page_obj'].paginator.next_cursor
+        keys = [
+            self.follower_client.get(
+                INDEX_URL, {'cursor': token}).context['cache_key']
+            for token in (cursor, cursor + '==')
+        ]
+        self.assertEqual(keys[0], keys[1])
+        response = self.follower_client.get(INDEX_URL, {'cursor': 'broken'})
+        self.assertEqual(response.context['cache_timeout'], 0)
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -227,3 +402,654 @@ class FollowViewsTest(TestCase):
         response = self.authorized_client.get(FOLLOW_INDEX_URL)
         new_post_unfollower = response.context['page_obj']
         self.assertNotIn(new_post_follower, new_post_unfollower)
+
+
+class QueryBudgetViewsTest(TestCase):
+    """Число запросов на страницах лент не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', group=cls.group, author=cls.user)
+            for i in range(RANGE_POSTS)
+        )
+        cls.GROUP_LIST_URL = reverse(
+            'posts:group_list', args=[cls.group.slug]
+        )
+        cls.PROFILE_URL = reverse(
+            'posts:profile', args=[cls.user.username]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_views_query_budget(self):
+        """Ленты укладываются в бюджет запросов."""
+        # Сессия и пользователь попадают в кэш с первым же запросом.
+        self.follower_client.get(reverse('about:author'))
+        budgets = {
+            INDEX_URL: 2,
+            self.GROUP_LIST_URL: 3,
+            self.PROFILE_URL: 4,
+            FOLLOW_INDEX_URL: 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.follower_client.get(url)
+
+
+@override_settings(
+    FEED_FANOUT=True, FEED_FANOUT_MAX_FOLLOWERS=1, FEED_FANOUT_PUSH_FOLLOWERS=0
+)
+class FeedFanoutViewsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.author = User.objects.create_user(username='someauthor')
+        cls.star = User.objects.create_user(username='star')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        Follow.objects.create(user=cls.other, author=cls.star)
+
+    def follow(self, author):
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[author.username])
+        )
+
+    def test_feed_entries_follow_subscriptions(self):
+        """Записи ленты появляются при подписке и посте, уходят при
+        отписке."""
+        old_post = Post.objects.create(author=self.author, text='Старый')
+        self.follow(self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.user).values_list(
+                'post', flat=True)),
+            {old_post.pk, new_post.pk}
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_feed_merges_pulled_authors(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        self.follow(self.author)
+        self.follow(self.star)
+        posts = [
+            Post.objects.create(
+                author=(self.star if i % 2 else self.author),
+                text=f'Тестовый текст {i}'
+            ) for i in range(RANGE_POSTS)
+        ]
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.star).exists()
+        )
+        first = self.authorized_client.get(FOLLOW_INDEX_URL)
+        page = first.context['page_obj']
+        second = self.authorized_client.get(
+            FOLLOW_INDEX_URL, {'cursor': page.paginator.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(page) + list(second), posts[::-1])
+
+    @override_settings(
+        FEED_FANOUT_MAX_FOLLOWERS=2, FEED_FANOUT_PUSH_FOLLOWERS=1
+    )
+    def test_author_switches_modes_with_hysteresis(self):
+        """Пост, написанный на чтении, остаётся в ленте и после возврата
+        автора на раскладку."""
+        third = User.objects.create_user(username='third')
+        self.follow(self.star)
+        third_follow = Follow.objects.create(user=third, author=self.star)
+        post = Post.objects.create(author=self.star, text='Пост звезды')
+        steps = [
+            (lambda: None, True),
+            (third_follow.delete, True),
+            (Follow.objects.filter(user=self.other).delete, False),
+        ]
+        for change, pulled in steps:
+            change()
+            with self.subTest(pulled=pulled):
+                self.assertEqual(feed.is_pulled(self.star.pk), pulled)
+                self.assertEqual(
+                    FeedEntry.objects.filter(user=self.user, post=post)
+                    .exists(), not pulled
+                )
+                response = self.authorized_client.get(FOLLOW_INDEX_URL)
+                self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(FEED_FANOUT_BACKFILL_POSTS=2)
+    def test_follow_backfills_recent_posts(self):
+        """Подписка раскладывает только последние посты автора, а
+        rebuild_feed — все."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(3)
+        ]
+        self.follow(self.author)
+        entries = FeedEntry.objects.filter(user=self.user)
+        self.assertEqual(
+            set(entries.values_list('post', flat=True)),
+            {post.pk for post in posts[1:]}
+        )
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(
+            set(entries.values_list('post', flat=True)),
+            {post.pk for post in posts}
+        )
+
+    def test_rebuild_feed_command(self):
+        """rebuild_feed заполняет ленты по текущим подпискам."""
+        self.follow(self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый')
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailViewsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            )
+        )
+        self.POST_DETAIL_URL = reverse(
+            'posts:post_detail', args=[self.post.id]
+        )
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, выводится заглушка и ставится задача."""
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            response = self.authorized_client.get(self.POST_DETAIL_URL)
+        self.assertContains(response, 'aspect-ratio')
+        schedule.assert_called_once_with(self.post)
+
+    def test_thumbnail_generated_on_schedule(self):
+        """После генерации шаблон выводит готовую миниатюру."""
+        thumbnails.schedule(self.post)
+        geometry, options = settings.POST_THUMBNAILS['post']
+        thumbnail = thumbnails.backend.cached_thumbnail(
+            self.post.image, geometry, **options
+        )
+        self.assertIsNotNone(thumbnail)
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            response = self.authorized_client.get(self.POST_DETAIL_URL)
+        self.assertContains(response, thumbnail.url)
+        schedule.assert_not_called()
+
+    def test_missing_source_is_not_requeued(self):
+        """Картинка без исходного файла запоминается как ошибка и не
+        ставится в очередь на каждой странице."""
+        self.post.image.storage.delete(self.post.image.name)
+        with self.assertLogs('posts.thumbnails', 'WARNING'):
+            thumbnails.schedule(self.post)
+        self.assertTrue(thumbnails.recently_failed(self.post.image.name))
+        with mock.patch('posts.thumbnails.generate') as generate:
+            self.authorized_client.get(self.POST_DETAIL_URL)
+        generate.assert_not_called()
+
+    def test_invalidate_keeps_index_for_older_posts(self):
+        """Миниатюра поста не с первой страницы главной не сбрасывает
+        кэш главной, только ленты автора."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Новее {index}')
+            for index in range(settings.PAGINATE_PAGE)
+        )
+        before = {
+            name: utils.generation(name)
+            for name in ('posts', f'author:{self.user.pk}')
+        }
+        thumbnails.invalidate({self.post.pk: (self.user.pk, None)})
+        self.assertEqual(utils.generation('posts'), before['posts'])
+        self.assertGreater(
+            utils.generation(f'author:{self.user.pk}'),
+            before[f'author:{self.user.pk}']
+        )
+
+    def test_post_create_schedules_thumbnails(self):
+        """post_create отправляет картинку на генерацию миниатюр."""
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            self.authorized_client.post(CREATE_POST_URL, {
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile(
+                    name='new.gif', content=SMALL_GIF,
+                    content_type='image/gif'
+                )
+            })
+        schedule.assert_called_once()
+
+    def test_warm_thumbnails_command(self):
+        """warm_thumbnails создаёт недостающие миниатюры и пропускает
+        готовые."""
+        out = StringIO()
+        call_command('warm_thumbnails', processes=1, stdout=out)
+        self.assertIn('Создано миниатюр: 1 ', out.getvalue())
+        self.assertEqual(thumbnails.missing(self.post.image.name), [])
+        out = StringIO()
+        call_command('warm_thumbnails', processes=1, stdout=out)
+        self.assertIn('уже готовы: 1', out.getvalue())
+        self.assertIn('Создано миниатюр: 0 ', out.getvalue())
+
+    def test_warm_thumbnails_reports_failures(self):
+        """Ошибки создания миниатюр выводятся с id поста."""
+        out, err = StringIO(), StringIO()
+        with mock.patch(
+            'posts.thumbnails.create', side_effect=OSError('битый файл')
+        ):
+            call_command(
+                'warm_thumbnails', processes=1, stdout=out, stderr=err
+            )
+        self.assertIn(f'Пост {self.post.pk}: OSError', err.getvalue())
+        self.assertIn('ошибок: 1', out.getvalue())
+
+    def test_warm_thumbnails_missing_source(self):
+        """Картинка без исходного файла — ошибка, а не созданная
+        миниатюра; кэш лент сбрасывается один раз за прогон."""
+        Post.objects.create(
+            author=self.user, text='Ещё пост',
+            image=SimpleUploadedFile(
+                name='more.gif', content=SMALL_GIF, content_type='image/gif'
+            )
+        )
+        self.post.image.storage.delete(self.post.image.name)
+        out, err = StringIO(), StringIO()
+        with mock.patch(
+            'posts.thumbnails.invalidate', wraps=thumbnails.invalidate
+        ) as invalidate:
+            call_command(
+                'warm_thumbnails', processes=1, stdout=out, stderr=err
+            )
+        self.assertIn(f'Пост {self.post.pk}: нет исходного файла',
+                      err.getvalue())
+        self.assertIn('Создано миниатюр: 1 ', out.getvalue())
+        invalidate.assert_called_once()
+
+    def test_list_page_looks_up_thumbnails_in_one_batch(self):
+        """Миниатюры всех постов страницы ищутся одним запросом."""
+        for index in range(2):
+            Post.objects.create(
+                author=self.user, text=f'Ещё пост {index}',
+                image=SimpleUploadedFile(
+                    name='more.gif', content=SMALL_GIF,
+                    content_type='image/gif'
+                )
+            )
+        thumbnails.create(self.post.image.name)
+        kvstore = default.kvstore
+        metrics.registry.reset()
+        with mock.patch('posts.thumbnails.schedule'), mock.patch.object(
+            kvstore, '_get_raw', wraps=kvstore._get_raw
+        ) as get_raw, mock.patch.object(
+            kvstore, 'get_many', wraps=kvstore.get_many
+        ) as get_many:
+            self.authorized_client.get(INDEX_URL)
+        get_many.assert_called_once()
+        get_raw.assert_not_called()
+        self.assertEqual(metrics.thumbnail_lookups.values, {
+            ('hit',): 1, ('miss',): 2,
+        })
+
+    def test_kvstore_reconnects_on_path_change(self):
+        """При смене пути открывается новый файл, а старое соединение
+        закрывается."""
+        kvstore = default.kvstore
+        old = kvstore.connection
+        path = os.path.join(TEMP_MEDIA_ROOT, 'other.sqlite3')
+        with override_settings(THUMBNAIL_KVSTORE_PATH=path):
+            self.assertIsNot(kvstore.connection, old)
+            self.assertTrue(os.path.exists(path))
+        with self.assertRaises(sqlite3.ProgrammingError):
+            old.execute('SELECT 1')
+
+    def test_kvstore_clear(self):
+        """clear удаляет из общего хранилища все записи sorl."""
+        thumbnails.create(self.post.image.name)
+        default.kvstore.clear()
+        self.assertEqual(thumbnails.missing(self.post.image.name), ['post'])
+        self.assertEqual(
+            default.kvstore._find_keys_raw(''), []
+        )
+
+
+class ExportViewsTest(TestCase):
+    """Потоковая выгрузка в админке и команда export_posts."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост в группе'
+        )
+        Post.objects.create(author=cls.other, text='Пост без группы')
+        Follow.objects.create(user=cls.other, author=cls.author)
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+        cls.POSTS_EXPORT_URL = reverse('admin:posts_post_export')
+
+    def rows(self, response):
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_admin_export_streams_filtered_posts(self):
+        """Выгрузка постов потоковая и учитывает фильтры."""
+        response = self.admin_client.get(
+            self.POSTS_EXPORT_URL, {'group': 'group', 'since': '2000-01-01'}
+        )
+        self.assertTrue(response.streaming)
+        rows = self.rows(response)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], self.post.pk)
+        self.assertEqual(rows[0]['author'], 'author')
+
+    def test_admin_export_csv(self):
+        """Выгрузка подписок в CSV с заголовком."""
+        response = self.admin_client.get(
+            reverse('admin:posts_follow_export'), {'format': 'csv'}
+        )
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.splitlines(), ['user,author', 'other,author'])
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+    def test_admin_export_rejects_bad_filters(self):
+        """Неверная дата или фильтр, которого нет у модели, — 400."""
+        cases = (
+            (self.POSTS_EXPORT_URL, {'since': 'вчера'}),
+            (reverse('admin:posts_follow_export'), {'group': 'group'}),
+        )
+        for url, params in cases:
+            with self.subTest(params=params):
+                response = self.admin_client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_admin_export_for_staff_only(self):
+        """Выгрузка недоступна пользователю без доступа в админку."""
+        client = Client()
+        client.force_login(self.other)
+        response = client.get(self.POSTS_EXPORT_URL)
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_posts_command_reads_in_batches(self):
+        """export_posts читает строки пачками по batch_size."""
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('export_posts', 'posts', batch_size=1, stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [row['text'] for row in rows],
+            ['Пост в группе', 'Пост без группы']
+        )
+        self.assertEqual(len(queries), 3)
+
+    def test_export_rejects_empty_batches(self):
+        """batch_size меньше 1 — ошибка, а не бесконечная выгрузка."""
+        for batch_size in (0, -1):
+            with self.subTest(batch_size=batch_size):
+                with self.assertRaisesMessage(CommandError, 'batch_size'):
+                    call_command(
+                        'export_posts', 'posts', batch_size=batch_size,
+                        stdout=StringIO()
+                    )
+                with self.assertRaises(ValueError):
+                    next(export.rows(
+                        'posts', Post.objects.values_list('pk', 'text'),
+                        batch_size
+                    ))
+
+
+@override_settings(COMMENTS_PAGE=2)
+class CommentsViewsTest(TestCase):
+    """Комментарии на странице поста выводятся страницами."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.commenters = [
+            User.objects.create_user(username=f'reader{index}')
+            for index in range(5)
+        ]
+        for index, commenter in enumerate(cls.commenters):
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {index}'
+            )
+        cls.client = Client()
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.pk])
+        cls.COMMENTS_URL = reverse('posts:comments', args=[cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comment_page(self):
+        """На странице поста только первые COMMENTS_PAGE комментариев."""
+        response = self.client.get(self.POST_DETAIL_URL)
+        page = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in page],
+            ['Комментарий 4', 'Комментарий 3']
+        )
+        self.assertContains(response, 'Показать ещё')
+
+    def test_post_detail_queries_do_not_depend_on_comments(self):
+        """Авторы комментариев выбираются вместе с комментариями."""
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.POST_DETAIL_URL)
+        cache.clear()
+        with self.settings(COMMENTS_PAGE=5), CaptureQueriesContext(
+            connection
+        ) as many:
+            self.client.get(self.POST_DETAIL_URL)
+        self.assertEqual(len(few), len(many))
+
+    def test_post_detail_cached(self):
+        """Повторный показ поста не обращается к базе."""
+        self.client.get(self.POST_DETAIL_URL)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.POST_DETAIL_URL)
+        self.assertEqual(response.context['post'], self.post)
+        self.assertEqual(len(response.context['comments']), 2)
+
+    def test_post_detail_cache_invalidation(self):
+        """Кэш поста сбрасывают правка поста, новый комментарий и новый
+        пост автора (счётчик постов)."""
+        self.client.get(self.POST_DETAIL_URL)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self.client.get(self.POST_DETAIL_URL)
+        self.assertEqual(response.context['post'].text, 'Исправленный пост')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        response = self.client.get(self.POST_DETAIL_URL)
+        self.assertEqual(
+            response.context['comments'][0].text, 'Свежий комментарий'
+        )
+        Post.objects.create(author=self.user, text='Ещё пост')
+        response = self.client.get(self.POST_DETAIL_URL)
+        self.assertEqual(
+            response.context['post'].author.counters.posts_count, 2
+        )
+
+    def test_post_detail_follows_commenter_rename(self):
+        """Переименование автора комментария сбрасывает кэш и ETag
+        страницы поста, а вход в систему — нет."""
+        etag = self.client.get(self.POST_DETAIL_URL)['ETag']
+        commenter = User.objects.get(pk=self.commenters[-1].pk)
+        self.client.force_login(self.user)
+        self.client.logout()
+        response = self.client.get(
+            self.POST_DETAIL_URL, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        commenter.username = 'renamed'
+        commenter.save()
+        response = self.client.get(
+            self.POST_DETAIL_URL, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'renamed')
+
+    def test_load_more_walks_all_comments(self):
+        """«Показать ещё» по токену отдаёт следующие комментарии."""
+        texts = []
+        cursor = None
+        while True:
+            params = {'format': 'json'}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(self.COMMENTS_URL, params).json()
+            texts += [comment['text'] for comment in data['comments']]
+            cursor = data['next']
+            if cursor is None:
+                break
+        self.assertEqual(
+            texts, [f'Комментарий {index}' for index in range(4, -1, -1)]
+        )
+
+    def test_load_more_fragment(self):
+        """Без format=json отдаётся HTML-фрагмент со ссылкой дальше."""
+        response = self.client.get(self.COMMENTS_URL)
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertContains(response, 'data-fragment')
+
+    def test_comments_of_missing_post(self):
+        """Комментарии несуществующего поста — 404."""
+        response = self.client.get(reverse('posts:comments', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalViewsTest(TestCase):
+    """ETag и Last-Modified страниц и ответ 304."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост'
+        )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        cls.urls = (
+            INDEX_URL,
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.user.username]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304 без тела."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_etag_changes_with_data(self):
+        """Новый комментарий меняет ETag страницы поста, но не группы."""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        changed = [
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+            for url, etag in zip(self.urls, etags)
+        ]
+        self.assertEqual(changed, [200, 304, 304, 200])
+
+    def test_etag_depends_on_viewer(self):
+        """У гостя и авторизованного пользователя разные ETag."""
+        etag = self.client.get(INDEX_URL)['ETag']
+        response = self.authorized_client.get(
+            INDEX_URL, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_csrf_token(self):
+        """Новый CSRF-токен (после входа) меняет ETag: форма комментария
+        в кэше браузера со старым токеном не подойдёт."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.authorized_client.cookies[settings.CSRF_COOKIE_NAME] = 'old'
+        etag = self.authorized_client.get(url)['ETag']
+        self.authorized_client.cookies[settings.CSRF_COOKIE_NAME] = 'new'
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_survives_cache_clear(self):
+        """После очистки кэша поколения не начинаются заново, и старый
+        ETag не совпадает."""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        cache.clear()
+        changed = [
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+            for url, etag in zip(self.urls, etags)
+        ]
+        self.assertEqual(changed, [200] * len(self.urls))
+
+    def test_last_modified_for_guests(self):
+        """Гость получает Last-Modified и 304 по If-Modified-Since."""
+        cache.set(utils.changed_key('posts'), time.time() - 60, None)
+        last_modified = self.client.get(INDEX_URL)['Last-Modified']
+        response = self.client.get(
+            INDEX_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(
+            self.authorized_client.get(INDEX_URL).has_header('Last-Modified')
+        )
+
+    def test_missing_group_is_not_found(self):
+        """Проверка ETag не мешает ответу 404."""
+        response = self.client.get(reverse('posts:group_list', args=['no']))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from core import metrics
+
+from .models import Post
+from .utils import bump_generation, read_timeout
+
+logger = logging.getLogger(__name__)
+
+FIRST_PAGE_KEY = 'posts:thumbnails:first-page'
+
+
+class PrefetchBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет только смотреть в KV-хранилище."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile миниатюры с тем же именем, что даст get_thumbnail."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage
+        )
+
+    def cached_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None, если её ещё не создали."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+    def cached_thumbnails(self, files, geometry_string, **options):
+        """Готовые миниатюры для нескольких картинок: {file: миниатюра или
+        None}. Хранилище с get_many ищет их одним запросом."""
+        thumbnail_files = {
+            file_: self.thumbnail_file(file_, geometry_string, **options)
+            for file_ in files
+        }
+        kvstore = default.kvstore
+        if not hasattr(kvstore, 'get_many'):
+            return {
+                file_: kvstore.get(thumbnail_file)
+                for file_, thumbnail_file in thumbnail_files.items()
+            }
+        found = kvstore.get_many(thumbnail_files.values())
+        return {
+            file_: found.get(thumbnail_file.key)
+            for file_, thumbnail_file in thumbnail_files.items()
+        }
+
+
+backend = PrefetchBackend()
+executor = ThreadPoolExecutor(
+    max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+)
+pending = set()
+pending_lock = threading.Lock()
+
+
+def missing(image_name, names=None):
+    """Имена из names (по умолчанию все POST_THUMBNAILS), для которых
+    в KV-хранилище нет миниатюры."""
+    names = settings.POST_THUMBNAILS if names is None else names
+    return [
+        name for name in names
+        if backend.cached_thumbnail(
+            image_name, settings.POST_THUMBNAILS[name][0],
+            **settings.POST_THUMBNAILS[name][1]
+        ) is None
+    ]
+
+
+def create(image_name, names=None):
+    """Создаёт миниатюры картинки (по умолчанию все из POST_THUMBNAILS)
+    и возвращает, сколько их действительно сохранено.
+
+    Без исходного файла sorl только пишет в лог и ничего не сохраняет,
+    поэтому результат сверяется с KV-хранилищем.
+    """
+    names = list(settings.POST_THUMBNAILS if names is None else names)
+    for name in names:
+        geometry, options = settings.POST_THUMBNAILS[name]
+        with metrics.thumbnail_duration.time(geometry=geometry):
+            backend.get_thumbnail(image_name, geometry, **options)
+    return len(names) - len(missing(image_name, names))
+
+
+def failure_key(image_name):
+    return add_prefix(image_name, identity='failure')
+
+
+def remember_failure(image_name):
+    """Запоминает в KV-хранилище, что миниатюры картинки не создались:
+    до THUMBNAIL_RETRY_SECONDS страницы не ставят её в очередь снова."""
+    default.kvstore._set_raw(failure_key(image_name), str(time.time()))
+
+
+def forget_failure(image_name):
+    default.kvstore._delete_raw(failure_key(image_name))
+
+
+def recently_failed(image_name):
+    failed = default.kvstore._get_raw(failure_key(image_name))
+    return failed is not None and (
+        time.time() - float(failed) < settings.THUMBNAIL_RETRY_SECONDS
+    )
+
+
+def first_page():
+    """id постов первой страницы главной. Хранятся в кэше до изменения
+    постов (posts.signals): при синхронном создании миниатюр страница
+    из многих картинок не повторяет этот запрос для каждой."""
+    ids = cache.get(FIRST_PAGE_KEY)
+    if ids is None:
+        ids = set(Post.objects.order_by('-pub_date', '-id').values_list(
+            'pk', flat=True)[:settings.PAGINATE_PAGE])
+        cache.set(FIRST_PAGE_KEY, ids, read_timeout(Post, None))
+    return ids
+
+
+def invalidate(feeds):
+    """Сбрасывает кэш лент, в которых показываются посты feeds —
+    {post_id: (author_id, group_id)}.
+
+    Профили и группы сбрасываются целиком, а главная — только если
+    какой-то из постов на её первой странице: иначе каждая картинка
+    сбрасывала бы кэш всех страниц главной. На остальных страницах
+    до следующего поста остаётся заглушка.
+    """
+    names = set()
+    for author_id, group_id in feeds.values():
+        names.add(f'author:{author_id}')
+        if group_id is not None:
+            names.add(f'group:{group_id}')
+    if not names:
+        return
+    if set(feeds) & first_page():
+        names.add('posts')
+    for name in sorted(names):
+        bump_generation(name)
+
+
+def generate(image_name, post_id, author_id, group_id):
+    """Создаёт все миниатюры картинки поста и сбрасывает кэш его лент."""
+    try:
+        if create(image_name) < len(settings.POST_THUMBNAILS):
+            remember_failure(image_name)
+            logger.warning('Не удалось создать миниатюры для %s', image_name)
+            return
+        invalidate({post_id: (author_id, group_id)})
+    except Exception:
+        remember_failure(image_name)
+        logger.exception('Не удалось создать миниатюры для %s', image_name)
+    finally:
+        with pending_lock:
+            pending.discard(image_name)
+
+
+def run_in_worker(*args):
+    try:
+        generate(*args)
+    finally:
+        connections.close_all()
+
+
+def schedule(post):
+    """Ставит создание миниатюр картинки поста в фоновую очередь, если
+    недавно оно не закончилось ошибкой.
+
+    In-memory SQLite (тесты) не виден из других потоков, поэтому там
+    миниатюры создаются сразу.
+    """
+    if not post.image or recently_failed(post.image.name):
+        return
+    with pending_lock:
+        if post.image.name in pending:
+            return
+        pending.add(post.image.name)
+    args = (post.image.name, post.pk, post.author_id, post.group_id)
+    in_memory = getattr(connection, 'is_in_memory_db', lambda: False)()
+    if not settings.THUMBNAIL_ASYNC or in_memory:
+        generate(*args)
+    else:
+        executor.submit(run_in_worker, *args)
+
+
+def prefetch(posts, name='post'):
+    """Ищет миниатюры name для всех постов страницы одним запросом."""
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    geometry, options = settings.POST_THUMBNAILS[name]
+    found = backend.cached_thumbnails(
+        [post.image for post in posts], geometry, **options
+    )
+    for post in posts:
+        if not hasattr(post, '_thumbnails'):
+            post._thumbnails = {}
+        post._thumbnails[name] = found[post.image]
+
+
+def ready_thumbnail(post, name):
+    """Готовая миниатюра картинки поста; если её нет — ставит в очередь."""
+    if not post.image:
+        return None
+    prefetched = getattr(post, '_thumbnails', {})
+    if name in prefetched:
+        thumbnail = prefetched[name]
+    else:
+        geometry, options = settings.POST_THUMBNAILS[name]
+        thumbnail = backend.cached_thumbnail(post.image, geometry, **options)
+    if thumbnail is None:
+        schedule(post)
+    return thumbnail
@@ -1,8 +1,321 @@
+import base64
+import json
+import time
+from math import ceil
+
+from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Наибольший INTEGER SQLite.
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(direction, key, number):
+    """Упаковывает ключ (значение, id) записи в непрозрачный токен."""
+    raw = json.dumps([direction, *key, number])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, value, pk, number = json.loads(raw.decode())
+        pk, number = int(pk), int(number)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # Id и номер страницы вне INTEGER SQLite уронили бы запрос.
+    if direction not in (NEXT, PREVIOUS) or not (
+        0 < pk <= MAX_ID and 0 < number <= MAX_ID
+    ):
+        return None
+    return direction, value, pk, number
+
+
+def count_key(kind, pk=None):
+    """Ключ кэша для числа постов в списке: all, group, author или feed."""
+    return f'posts:count:{kind}' if pk is None else f'posts:count:{kind}:{pk}'
+
+
+def first_generation():
+    """Начальное поколение — время в наносекундах, а не 1: после
+    вытеснения или cache.clear() номера не повторяют прежние, и старый
+    ETag или ключ кэша не совпадёт с новыми данными."""
+    return time.time_ns()
+
+
+def generation(name):
+    """Текущее поколение данных name; входит в ключи кэша страниц."""
+    return cache.get_or_set(
+        f'posts:generation:{name}', first_generation, None
+    )
+
+
+def generations(names):
+    """Поколения нескольких данных за одно обращение к кэшу (отсутствующие
+    заводятся через generation)."""
+    keys = {name: f'posts:generation:{name}' for name in names}
+    found = cache.get_many(keys.values())
+    return {
+        name: found[key] if key in found else generation(name)
+        for name, key in keys.items()
+    }
+
+
+def changed_key(name):
+    """Ключ кэша со временем последнего изменения данных name."""
+    return f'posts:changed:{name}'
+
+
+def bump_generation(name):
+    """Сдвигает поколение, после чего старые ключи кэша не используются,
+    и запоминает время изменения."""
+    key = f'posts:generation:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, first_generation(), None)
+    cache.set(changed_key(name), time.time(), None)
+
+
+def lookup(request, queryset, **filters):
+    """get_object_or_404, запомненный до конца запроса: объект нужен и для
+    ETag (см. posts.conditional), и самому представлению."""
+    key = str(queryset.query), tuple(sorted(filters.items()))
+    found = request.__dict__.setdefault('_lookups', {})
+    if key not in found:
+        found[key] = get_object_or_404(queryset, **filters)
+    return found[key]
+
+
+def read_timeout(model, timeout):
+    """Время жизни кэша данных model, прочитанных в этом запросе.
+
+    Реплика может отставать до REPLICA_PIN_SECONDS и вернуть данные до
+    только что сброшенной правки, поэтому прочитанное из реплики
+    хранится не дольше.
+    """
+    if router.db_for_read(model) == DEFAULT_DB_ALIAS:
+        return timeout
+    if timeout is None:
+        return settings.REPLICA_PIN_SECONDS
+    return min(timeout, settings.REPLICA_PIN_SECONDS)
+
+
+def page_cache(request, name, page, timeout):
+    """Время жизни и ключ кэша страницы ленты для шаблона.
+
+    Ключ собирается из поколения name, разобранной позиции страницы и
+    вида для гостя или авторизованного пользователя, а не из строки
+    запроса. Страница по испорченному курсору не кэшируется: иначе
+    каждый такой курсор заводил бы новую запись.
+    """
+    paginator = page.paginator
+    if not getattr(paginator, 'cursor_valid', True):
+        return {'cache_timeout': 0, 'cache_key': 'invalid'}
+    if getattr(paginator, 'cursor', None):
+        direction, value, pk, number = paginator.cursor
+        position = f'{direction}:{value.isoformat()}:{pk}:{number}'
+    else:
+        position = str(page.number)
+    return {
+        'cache_timeout': read_timeout(paginator.object_list.model, timeout),
+        'cache_key': ':'.join((
+            str(generation(name)), position,
+            'auth' if request.user.is_authenticated else 'anon',
+        )),
+    }
+
+
+class CachedCount:
+    """Число постов в списке, которое хранится в кэше.
+
+    Считается через COUNT(*) только при промахе; сбрасывается сигналами
+    создания и удаления постов и подписок (см. posts.signals).
+    """
+
+    def __init__(self, key, timeout=settings.POSTS_COUNT_TIMEOUT):
+        self.key = key
+        self.timeout = timeout
+
+    def count(self, post_list):
+        count = cache.get(self.key)
+        if count is None:
+            count = post_list.count()
+            cache.set(
+                self.key, count, read_timeout(post_list.model, self.timeout)
+            )
+        return count
+
+
+def keyset_slice(queryset, key, direction, date_field='pub_date',
+                 id_field='id'):
+    """Записи queryset строго старше (NEXT) или новее (PREVIOUS) ключа.
+
+    queryset должен быть упорядочен по убыванию (date_field, id_field);
+    для PREVIOUS порядок разворачивается.
+    """
+    if key is None:
+        return queryset
+    pub_date, pk = key
+    if direction == NEXT:
+        return queryset.filter(
+            Q(**{f'{date_field}__lt': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__lt': pk})
+        )
+    return queryset.filter(
+        Q(**{f'{date_field}__gt': pub_date})
+        | Q(**{date_field: pub_date, f'{id_field}__gt': pk})
+    ).reverse()
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который берёт общее число объектов у count_provider.
+
+    count_provider — любой объект с методом count(object_list).
+    """
+
+    def __init__(self, object_list, per_page, count_provider=None):
+        super().__init__(object_list, per_page)
+        self.count_provider = count_provider
+
+    @cached_property
+    def count(self):
+        if self.count_provider is None:
+            return super().count
+        return self.count_provider.count(self.object_list)
+
+    @property
+    def total_pages(self):
+        return max(1, ceil(self.count / self.per_page))
+
+
+class KeysetRows:
+    """Строки страницы, которые выбираются из базы при первом обращении."""
+
+    def __init__(self, paginator):
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.paginator.rows)
+
+    def __len__(self):
+        return len(self.paginator.rows)
+
+
+class CursorPaginator(CountedPaginator):
+    """Keyset-пагинация постов по паре (pub_date, id).
+
+    Страница выбирается условием «старше/новее последнего показанного
+    поста» по индексу pub_date, без COUNT(*) и OFFSET, поэтому любая
+    страница стоит столько же, сколько первая. Номер страницы только
+    переносится в токене и нужен для отображения.
+    """
+    is_keyset = True
+    date_field = 'pub_date'
+
+    def __init__(self, object_list, per_page, cursor=None,
+                 count_provider=None):
+        super().__init__(
+            object_list.order_by(f'-{self.date_field}', '-id'), per_page,
+            count_provider
+        )
+        self.cursor = decode_cursor(cursor) if cursor else None
+        self.cursor_valid = not cursor or self.cursor is not None
+        if self.cursor:
+            direction, value, pk, number = self.cursor
+            value = self.parse_key(value)
+            self.cursor_valid = value is not None
+            at_start = direction == PREVIOUS and number == 1
+            self.cursor = (
+                None if value is None or at_start
+                else (direction, value, pk, number)
+            )
+
+    def key_of(self, post):
+        """Ключ поста для токена: (pub_date, id)."""
+        return getattr(post, self.date_field).isoformat(), post.pk
+
+    def parse_key(self, value):
+        """Значение ключа из токена или None, если оно испорчено."""
+        try:
+            return parse_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+    def fetch(self, key, direction, limit):
+        """До limit постов за ключом key в направлении direction.
+
+        Для PREVIOUS посты идут от старых к новым. Подклассы могут
+        собирать посты из других источников с тем же ключом.
+        """
+        return list(keyset_slice(
+            self.object_list, key, direction, self.date_field
+        )[:limit])
+
+    @cached_property
+    def window(self):
+        """Посты страницы и признак того, что за ними есть ещё."""
+        if self.cursor is None:
+            rows = self.fetch(None, NEXT, self.per_page + 1)
+            return rows[:self.per_page], len(rows) > self.per_page
+        direction, pub_date, pk, _ = self.cursor
+        if direction == NEXT:
+            rows = self.fetch((pub_date, pk), NEXT, self.per_page + 1)
+            return rows[:self.per_page], len(rows) > self.per_page
+        rows = self.fetch((pub_date, pk), PREVIOUS, self.per_page)
+        return rows[::-1], True
+
+    @property
+    def rows(self):
+        return self.window[0]
+
+    @property
+    def number(self):
+        return self.cursor[3] if self.cursor else 1
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self.window[1] else self.number
+
+    @property
+    def next_cursor(self):
+        if not self.window[1] or not self.rows:
+            return None
+        return encode_cursor(NEXT, self.key_of(self.rows[-1]), self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if self.number == 1 or not self.rows:
+            return None
+        return encode_cursor(
+            PREVIOUS, self.key_of(self.rows[0]), self.number - 1
+        )
+
+    def get_page(self, number=None):
+        return self._get_page(KeysetRows(self), self.number, self)
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии от новых к старым, ключ (created, id)."""
+    date_field = 'created'
 
 
-def paginate(request, post_list, paginate_page=settings.PAGINATE_PAGE):
-    paginator = Paginator(post_list, paginate_page)
+def paginate(request, post_list, paginate_page=settings.PAGINATE_PAGE,
+             count_provider=None, paginator_class=CursorPaginator):
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        paginator = CountedPaginator(post_list, paginate_page, count_provider)
+        return paginator.get_page(page_number)
+    paginator = paginator_class(
+        post_list, paginate_page, request.GET.get('cursor'), count_provider
+    )
+    return paginator.get_page()
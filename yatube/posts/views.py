@@ -1,53 +1,134 @@
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import conditional, detail, thumbnails
+from .feed import FeedPaginator
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .utils import paginate
+from .search import SearchPaginator
+from .utils import (
+    CachedCount, CursorPaginator, count_key, lookup, page_cache, paginate
+)
 
 
+@conditional.conditional(conditional.index_names)
 def index(request):
     """Главная страница."""
+    page_obj = paginate(
+        request, Post.objects.for_listing(),
+        count_provider=CachedCount(count_key('all'))
+    )
     return render(
-        request, 'posts/index.html',
-        {'page_obj': paginate(request, Post.objects.all())}
+        request, 'posts/index.html', {
+            'page_obj': page_obj,
+            **page_cache(
+                request, 'posts', page_obj, settings.INDEX_CACHE_TIMEOUT
+            ),
+        }
     )
 
 
+@conditional.conditional(conditional.group_names)
 def group_posts(request, slug):
     """Посты группы."""
+    group = lookup(request, Group.objects.all(), slug=slug)
+    page_obj = paginate(
+        request, group.posts.for_listing(),
+        count_provider=CachedCount(count_key('group', group.pk))
+    )
     return render(
         request, 'posts/group_list.html', {
-            'page_obj': paginate(
-                request, get_object_or_404(Group, slug=slug).posts.all()
+            'page_obj': page_obj,
+            'group': group,
+            **page_cache(
+                request, f'group:{group.pk}', page_obj,
+                settings.LIST_CACHE_TIMEOUT
             ),
-            'group': get_object_or_404(Group, slug=slug)
         }
     )
 
 
+@conditional.conditional(conditional.profile_names)
 def profile(request, username):
     """Профиль пользователя."""
-    author = get_object_or_404(User, username=username)
+    author = lookup(
+        request, User.objects.select_related('counters'), username=username
+    )
+    page_obj = paginate(
+        request, author.posts.for_listing(),
+        count_provider=CachedCount(count_key('author', author.pk))
+    )
     return render(
         request, 'posts/profile.html', {
-            'page_obj': paginate(request, author.posts.all()),
+            'page_obj': page_obj,
             'author': author,
             'following': (
                 request.user.is_authenticated and request.user != author
                 and Follow.objects.filter(
-                    user=request.user, author=author).exists())
+                    user=request.user, author=author).exists()),
+            **page_cache(
+                request, f'author:{author.pk}', page_obj,
+                settings.LIST_CACHE_TIMEOUT
+            ),
         }
     )
 
 
+@conditional.conditional(conditional.post_names)
 def post_detail(request, post_id):
     """Подробности поста."""
+    post, comments = detail.load(post_id, request.GET.get('cursor'))
     return render(
         request, 'posts/post_detail.html', {
-            'post': get_object_or_404(Post, pk=post_id),
+            'post': post,
             'form': CommentForm(),
-            'comments': get_object_or_404(Post, id=post_id).comments.all()
+            'comments': comments,
+        }
+    )
+
+
+@conditional.conditional(conditional.post_names)
+def comments(request, post_id):
+    """Следующая страница комментариев для «Показать ещё»: HTML-фрагмент
+    или JSON при format=json."""
+    page = detail.comments_of(post_id, request.GET.get('cursor')).get_page()
+    if not page and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [{
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created,
+            } for comment in page],
+            'next': page.paginator.next_cursor,
+        }, json_dumps_params={'ensure_ascii': False})
+    return render(
+        request, 'posts/includes/comment_list.html', {
+            'comments': page, 'post_id': post_id,
+        }
+    )
+
+
+@conditional.conditional(conditional.index_names)
+def search(request):
+    """Поиск по постам и комментариям."""
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(
+        Post.objects.for_listing(), settings.PAGINATE_PAGE,
+        request.GET.get('cursor'), query=query
+    )
+    return render(
+        request, 'posts/search.html', {
+            'query': query,
+            'page_obj': paginator.get_page(),
+            'extra_query': urlencode({'q': query}) + '&',
         }
     )
 
@@ -61,6 +142,7 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     form.save()
+    thumbnails.schedule(post)
     return redirect('posts:profile', request.user)
 
 
@@ -82,6 +164,8 @@ def post_edit(request, post_id):
         return render(request, 'posts/create_post.html', context)
     form = PostForm(request.POST, files=request.FILES or None, instance=post)
     form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post)
     return redirect('posts:post_detail', post_id=post.id)
 
 
@@ -99,13 +183,20 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional.conditional(conditional.follow_names)
 def follow_index(request):
     """Посты авторов, на которых подписан текущий пользователь."""
+    paginator_class = CursorPaginator
+    if settings.FEED_FANOUT:
+        paginator_class = partial(FeedPaginator, user=request.user)
     return render(
         request, 'posts/follow.html', {
             'page_obj': paginate(
-                request, Post.objects.filter(
-                    author__following__user=request.user))})
+                request, Post.objects.for_listing().filter(
+                    author__following__user=request.user),
+                count_provider=CachedCount(
+                    count_key('feed', request.user.pk)),
+                paginator_class=paginator_class)})
 
 
 @login_required
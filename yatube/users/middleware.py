@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+def user_key(user_id):
+    """Ключ кэша пользователя; сбрасывается при сохранении пользователя
+    (в том числе смене пароля) и выходе (см. users.signals)."""
+    return f'users:user:{user_id}'
+
+
+def load_user(user_id, backend_path):
+    key = user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = auth.load_backend(backend_path).get_user(user_id)
+        if user is not None:
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_user(request):
+    """То же, что django.contrib.auth.get_user, но пользователь берётся
+    из кэша, а не из базы.
+
+    Хэш пароля в сессии по-прежнему сверяется с пользователем: после смены
+    пароля кэш сброшен, и старые сессии перестают действовать.
+    """
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    user = load_user(user_id, backend_path)
+    if user is None:
+        return AnonymousUser()
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    )):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, которая не ходит в auth_user на каждый
+    запрос: request.user читается из кэша по id из сессии."""
+
+    def process_request(self, request):
+        # Родитель проверяет порядок middleware и ставит свой request.user.
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,21 @@
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts.models import User
+
+from .middleware import user_key
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    # Сохранение — это и смена пароля, и блокировка, и last_login.
+    cache.delete(user_key(instance.pk))
+
+
+@receiver(user_logged_out)
+def drop_cached_user_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        cache.delete(user_key(user.pk))
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import User
+
+from .middleware import user_key
+
+
+class CachedAuthenticationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='old-Passw0rd'
+        )
+        self.client.login(username='reader', password='old-Passw0rd')
+        self.INDEX_URL = reverse('posts:index')
+
+    def test_no_session_and_user_queries(self):
+        """Сессия и пользователь читаются из кэша, а не из базы."""
+        self.client.get(self.INDEX_URL)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.INDEX_URL)
+        self.assertEqual(response.context['user'], self.user)
+        for query in queries.captured_queries:
+            self.assertNotIn('django_session', query['sql'])
+            self.assertNotIn(
+                f'"auth_user"."id" = {self.user.pk}', query['sql']
+            )
+
+    def test_password_change_ends_other_sessions(self):
+        """После смены пароля другие сессии пользователя недействительны."""
+        other = Client()
+        other.login(username='reader', password='old-Passw0rd')
+        other.get(self.INDEX_URL)
+        response = self.client.post(reverse('users:password_change'), {
+            'old_password': 'old-Passw0rd',
+            'new_password1': 'new-Passw0rd',
+            'new_password2': 'new-Passw0rd',
+        })
+        self.assertRedirects(response, reverse('users:password_change_done'))
+        self.assertTrue(
+            self.client.get(self.INDEX_URL).context['user'].is_authenticated
+        )
+        self.assertFalse(
+            other.get(self.INDEX_URL).context['user'].is_authenticated
+        )
+
+    def test_deactivated_user_is_logged_out(self):
+        """Заблокированный пользователь сразу становится гостем."""
+        self.client.get(self.INDEX_URL)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(
+            self.client.get(self.INDEX_URL).context['user'].is_authenticated
+        )
+
+    def test_logout_drops_cached_user(self):
+        """Выход сбрасывает пользователя из кэша."""
+        self.client.get(self.INDEX_URL)
+        self.assertIsNotNone(cache.get(user_key(self.user.pk)))
+        self.client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
+        self.assertFalse(
+            self.client.get(self.INDEX_URL).context['user'].is_authenticated
+        )
@@ -1,8 +1,22 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Служебные файлы SQLite (миниатюры, кэш) лежат вне MEDIA_ROOT, чтобы их
+# нельзя было скачать по MEDIA_URL. Тесты (manage.py test и pytest)
+# получают свой временный каталог и не трогают файлы разработчика.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    DATA_DIR = tempfile.mkdtemp(prefix='yatube-test-')
+    atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+else:
+    DATA_DIR = BASE_DIR
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -40,11 +54,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.SamplingProfilerMiddleware',
+    'core.middleware.QueryCountMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -55,7 +73,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,9 +98,60 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, PRAGMA выполняются один раз.
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
+# Учёт запросов к базе (см. core.middleware.QueryCountMiddleware):
+# медленные запросы, бюджет запросов на представление (без учёта
+# промахов кэша фрагментов ниже не бывает) и что делать при превышении.
+QUERY_SLOW_MS = 100
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 4,
+    'posts:comments': 4,
+    'posts:follow_index': 7,
+}
+QUERY_BUDGET_RAISE = DEBUG
+
+# Сжатие ответов (core.middleware.CompressionMiddleware): brotli, если
+# установлен пакет brotli, иначе gzip. HTML перед сжатием минифицируется.
+HTML_MINIFY = True
+COMPRESS_MIN_LENGTH = 200
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+# Страницы с CSRF-токеном сжимаются с комментарием случайной длины до
+# COMPRESS_BREACH_PADDING символов (защита от BREACH).
+COMPRESS_CSRF_PAGES = True
+COMPRESS_BREACH_PADDING = 64
+
+# Чтение — из реплик, запись — в default (см. core.routers). После записи
+# клиент REPLICA_PIN_SECONDS секунд читает из default, чтобы увидеть свои
+# изменения.
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+PRIMARY_PIN_COOKIE = 'pin_primary'
+REPLICA_PIN_SECONDS = 5
+
+# PRAGMA для каждого нового соединения с SQLite (см. core.db): WAL —
+# читатели не ждут писателя; synchronous=NORMAL — fsync только при
+# чекпойнте; busy_timeout — ждать блокировку, а не падать с «database is
+# locked»; mmap и cache_size — меньше системных вызовов на чтение.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -116,6 +185,13 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Сессии пишутся и в базу, и в кэш, а читаются из кэша; вытесненная из
+# кэша сессия читается из базы.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# Пользователь для request.user (users.middleware); кэш сбрасывается при
+# сохранении пользователя и выходе.
+USER_CACHE_TIMEOUT = 60 * 60
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -128,11 +204,46 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGINATE_PAGE = 10
 
+# Комментариев на странице поста и в каждой подгрузке «Показать ещё».
+COMMENTS_PAGE = 20
+
+POSTS_COUNT_TIMEOUT = 60 * 60
+
+# Ключ кэша главной меняется при любом изменении постов и комментариев.
+INDEX_CACHE_TIMEOUT = 60 * 60
+# Страницы групп и профилей сбрасываются только постами этой группы
+# или автора.
+LIST_CACHE_TIMEOUT = 60 * 60
+# Данные страницы поста сбрасываются правкой поста и комментариями к нему,
+# а счётчик постов автора и группа сверяются по поколениям.
+POST_DETAIL_CACHE_TIMEOUT = 60 * 60
+
+# Лента подписок из таблицы FeedEntry (fan-out on write). Перед включением
+# на существующей базе заполните её командой rebuild_feed.
+FEED_FANOUT = False
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении. Обратно на раскладку автор переходит, когда
+# подписчиков становится не больше FEED_FANOUT_PUSH_FOLLOWERS.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_FANOUT_PUSH_FOLLOWERS = 800
+FEED_FANOUT_BATCH_SIZE = 1000
+# Сколько последних постов автора раскладывается по лентам в запросе
+# подписки или при возврате автора на раскладку: хватает на первые
+# страницы ленты, а число строк в одном запросе ограничено. Полностью
+# ленты заполняет rebuild_feed.
+FEED_FANOUT_BACKFILL_POSTS = 30
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Общий для всех процессов кэш в файле SQLite (см. core.cache).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(DATA_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
     }
 }
 
@@ -145,6 +256,39 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Миниатюры картинок постов: имя -> (геометрия, опции sorl-thumbnail).
+# Создаются в фоне после сохранения поста; до этого шаблоны показывают
+# заглушку.
+POST_THUMBNAILS = {
+    'post': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+# Картинка, миниатюры которой не создались (например, нет исходного
+# файла), снова ставится в очередь не раньше чем через столько секунд.
+THUMBNAIL_RETRY_SECONDS = 60 * 60
+# Метаданные миниатюр хранятся в общем для всех процессов файле SQLite.
+THUMBNAIL_KVSTORE = 'posts.kvstore.SharedKVStore'
+THUMBNAIL_KVSTORE_PATH = os.path.join(DATA_DIR, 'thumbnails.sqlite3')
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Метрики для Prometheus (см. core.metrics). METRICS_DIR — общий каталог,
+# через который воркеры складывают значения; None — только свой процесс.
+# /metrics отдаётся только с заголовком Authorization: Bearer METRICS_TOKEN;
+# без токена выгрузка закрыта.
+METRICS_DIR = None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Выборочное профилирование запросов (см. core.profiling): каждый
+# PROFILER_SAMPLE_RATE-й запрос (0 — только по заголовку) или запрос с
+# подписанным заголовком X-Profile. Стеки смотреть в /admin/profiles/;
+# с PROFILER_DIR они ещё и дописываются в файлы .folded.
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_RATE = 100
+PROFILER_INTERVAL = 0.005
+PROFILER_HEADER = 'HTTP_X_PROFILE'
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+PROFILER_DIR = None
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import include, path
 
+from core import views as core_views
+
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
@@ -10,10 +12,12 @@ handler403 = 'core.views.permission_denied'
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('admin/profiles/', core_views.profiles, name='profiles'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', core_views.metrics, name='metrics'),
 ]
 
 if settings.DEBUG: